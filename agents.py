@@ -1,19 +1,212 @@
-import re
 import os
-import json
-from crewai import Agent, Task, Crew, LLM
+import hashlib
+import sqlite3
+from contextlib import closing
+from functools import cache, cached_property, wraps
+from crewai import Agent, Task, Crew, LLM, Process
 from dotenv import load_dotenv
 from crewai.tools import BaseTool
+from crewai.types.streaming import StreamChunkType
+import time
+import asyncio
+import contextvars
+import threading
+import weakref
+import httpx
+import orjson
 import requests
-from datetime import datetime, date
-import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, date, timezone
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
 load_dotenv()
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Ensure you have these in your .env file
 UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
-UNSPLASH_SECRET_KEY = os.getenv("UNSPLASH_SECRET_KEY")
+# Set TRIPCREW_DEBUG=1 to stream the DEBUG traces (agents, crews, raw outputs) into the Streamlit page
+DEBUG = os.getenv("TRIPCREW_DEBUG") == "1"
+# Set CREWAI_VERBOSE=1 to get crewai's per-step agent/crew console logging back
+VERBOSE = os.getenv("CREWAI_VERBOSE") == "1"
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def _dbg(*args, **kwargs):
+    """
+    st.write for DEBUG traces; a no-op unless TRIPCREW_DEBUG=1, so large objects are never rendered.
+    Streamlit is imported here rather than at module load, so the FastAPI app never loads it.
+    """
+    if DEBUG:
+        import streamlit as st
+        st.write(*args, **kwargs)
+
+
+# Shared HTTP session: keeps TCP/TLS connections to Unsplash and OpenWeather alive across calls.
+# Rate-limit and gateway errors are retried with backoff (honouring Retry-After); once retries
+# run out the last response is returned so raise_for_status reports the real status.
+_HTTP = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                            max_retries=Retry(total=2, read=0, backoff_factor=0.2,
+                                              status_forcelist=(429, 500, 502, 503, 504),
+                                              raise_on_status=False))
+# (connect, read) seconds for every external API call. Read timeouts aren't retried (read=0),
+# so a hung upstream costs one timeout and the tool fails fast instead of stalling the crew.
+HTTP_TIMEOUT = (3, 5)
+UNSPLASH_UNAVAILABLE = "Unsplash is unavailable right now; continue without images."
+_HTTP.mount("https://", _HTTP_ADAPTER)
+_HTTP.mount("http://", _HTTP_ADAPTER)
+
+# TTL caches for external API results, keyed by the normalized query / city name.
+# Streamlit reruns and repeated agent tool calls are served from memory instead of the network.
+CACHE_TTL_SECONDS = 600
+CACHE_MAX_ENTRIES = 256
+_CACHE_LOCK = threading.Lock()
+_UNSPLASH_CACHE = {}
+_WEATHER_CACHE = {}
+_CREW_CACHE = {}
+
+
+def _cache_key(text) -> str:
+    return str(text).strip().lower()
+
+
+def _cache_get(cache: dict, key: str, ttl: float = CACHE_TTL_SECONDS):
+    with _CACHE_LOCK:
+        entry = cache.get(key)
+    if entry and time.monotonic() - entry[0] < ttl:
+        return entry[1]
+    return None
+
+
+def _cache_put(cache: dict, key: str, value):
+    with _CACHE_LOCK:
+        cache.pop(key, None)
+        cache[key] = (time.monotonic(), value)
+        while len(cache) > CACHE_MAX_ENTRIES:
+            cache.pop(next(iter(cache)))
+
+
+# Optional on-disk layer under the Unsplash memory cache. Photo URLs for a place rarely change,
+# so with UNSPLASH_CACHE_DIR set they survive restarts and are shared across workers for a week.
+UNSPLASH_CACHE_DIR = os.getenv("UNSPLASH_CACHE_DIR")
+UNSPLASH_DISK_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _unsplash_db():
+    conn = sqlite3.connect(os.path.join(UNSPLASH_CACHE_DIR, "unsplash.sqlite3"), timeout=5)
+    conn.execute("CREATE TABLE IF NOT EXISTS photos (query TEXT PRIMARY KEY, stored_at REAL, urls TEXT)")
+    return conn
+
+
+def _unsplash_cache_get(key: str):
+    """Memory first, then disk (promoting hits to memory); None on a miss."""
+    cached = _cache_get(_UNSPLASH_CACHE, key)
+    if cached is not None or not UNSPLASH_CACHE_DIR:
+        return cached
+    try:
+        with closing(_unsplash_db()) as conn:
+            row = conn.execute("SELECT stored_at, urls FROM photos WHERE query = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row and time.time() - row[0] < UNSPLASH_DISK_TTL_SECONDS:
+        _cache_put(_UNSPLASH_CACHE, key, row[1])
+        return row[1]
+    return None
+
+
+def _unsplash_cache_put(key: str, urls_json: str):
+    _cache_put(_UNSPLASH_CACHE, key, urls_json)
+    if not UNSPLASH_CACHE_DIR:
+        return
+    try:
+        os.makedirs(UNSPLASH_CACHE_DIR, exist_ok=True)
+        with closing(_unsplash_db()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO photos VALUES (?, ?, ?)", (key, time.time(), urls_json))
+    except (OSError, sqlite3.Error):
+        pass  # the disk layer is best-effort; memory still has the result
+
+
+# Upper bound on concurrent Unsplash/OpenWeather requests issued by the batch tools
+TOOL_MAX_WORKERS = 8
+
+
+def _parse_batch_input(raw) -> list:
+    """
+    Accepts a JSON list (or a comma-separated string) of queries from the agent
+    and returns a clean list of non-empty strings.
+    """
+    if isinstance(raw, (list, tuple)):
+        items = raw
+    else:
+        try:
+            items = orjson.loads(raw)
+        except (TypeError, ValueError):
+            items = str(raw).split(",")
+        if not isinstance(items, list):
+            items = [items]
+    return [str(item).strip() for item in items if str(item).strip()]
+
+
+def _extract_unsplash_urls(content: bytes) -> list:
+    """
+    Pulls only results[].urls.regular out of an Unsplash search payload.
+    The payload carries user/links/EXIF metadata per photo; orjson decodes it far faster than
+    response.json(), and nothing but the URL strings is kept.
+    """
+    results = orjson.loads(content).get("results") or ()
+    return [photo["urls"]["regular"] for photo in results]
+
+
+def _decode_tool_result(result):
+    """Tool results are JSON on success and plain error strings otherwise."""
+    try:
+        return orjson.loads(result)
+    except (TypeError, ValueError):
+        return result
+
+
+def _first_task_raw(result) -> str:
+    """Raw text of a crew's first task output, or "No output" when there is none."""
+    task_output = (getattr(result, "tasks_output", None) or [None])[0]
+    return task_output.raw if task_output else "No output"
+
+
+def _first_task_structured(result):
+    """
+    A crew's first task output as the dict its output_pydantic model validated, keeping only
+    the fields the model sent; falls back to the raw text when validation didn't happen.
+    """
+    task_output = (getattr(result, "tasks_output", None) or [None])[0]
+    if task_output is None:
+        return "No output"
+    if task_output.pydantic is not None:
+        return task_output.pydantic.model_dump(by_alias=True, exclude_unset=True)
+    return task_output.raw
+
+
+def _encode_tool_result(result) -> str:
+    """Inverse of _decode_tool_result: error strings pass through, data becomes JSON."""
+    return result if isinstance(result, str) else orjson.dumps(result).decode()
+
+
+def _fan_out(fn, items) -> dict:
+    """
+    Runs fn over items concurrently and returns {item: result}, keeping input order.
+    Items that share a cache key ("Goa" / "goa ") are fetched once and share the result.
+    """
+    unique = {}
+    for item in items:
+        unique.setdefault(_cache_key(item), item)
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(TOOL_MAX_WORKERS, len(unique))) as pool:
+        results = dict(zip(unique, pool.map(fn, unique.values())))
+    return {item: results[_cache_key(item)] for item in items}
 
 
 # ----------------------------
@@ -27,6 +220,13 @@ class UnsplashSearchTool(BaseTool):
         """
         Searches Unsplash for images based on a query and returns a list of URLs.
         """
+        if not UNSPLASH_ACCESS_KEY:
+            return "Unsplash API key not configured. Cannot search images."
+        if not _cache_key(query or ""):
+            return "No search query provided."
+        cached = _unsplash_cache_get(_cache_key(query))
+        if cached is not None:
+            return cached
         try:
             url = "https://api.unsplash.com/search/photos"
             params = {
@@ -35,21 +235,37 @@ class UnsplashSearchTool(BaseTool):
                 "client_id": UNSPLASH_ACCESS_KEY
             }
 
-            response = requests.get(url, params=params)
+            response = _HTTP.get(url, params=params, timeout=HTTP_TIMEOUT)
             response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-            data = response.json()
-
-            if not data.get("results"):
+            image_urls = _extract_unsplash_urls(response.content)
+            if not image_urls:
                 return "No images found for the query."
 
-            image_urls = [photo["urls"]["regular"] for photo in data["results"]]
-            return json.dumps(image_urls)
+            result = orjson.dumps(image_urls).decode()
+            _unsplash_cache_put(_cache_key(query), result)
+            return result
 
+        except requests.exceptions.Timeout:
+            return UNSPLASH_UNAVAILABLE
         except requests.exceptions.RequestException as e:
             return f"An error occurred while making an API request: {e}"
         except Exception as e:
             return f"An error occurred while searching Unsplash: {e}"
 
+    async def _arun(self, query: str) -> str:
+        """
+        Async _run for crewai's async tool dispatch; same JSON-or-error-string result.
+        """
+        results = await search_unsplash_async([query])
+        return _encode_tool_result(results[query])
+
+    def _run_batch(self, queries: list) -> str:
+        """
+        Searches Unsplash for several queries concurrently; returns {query: urls-or-error}.
+        """
+        results = _fan_out(self._run, queries)
+        return orjson.dumps({q: _decode_tool_result(r) for q, r in results.items()}).decode()
+
 
 # NEW: OpenWeather Tool Class
 class OpenWeatherTool(BaseTool):
@@ -62,38 +278,202 @@ class OpenWeatherTool(BaseTool):
         """
         if not OPENWEATHER_API_KEY:
             return "OpenWeather API key not found. Cannot fetch weather."
+        if not _cache_key(city_name or ""):
+            return "No city name provided."
+        cached = _cache_get(_WEATHER_CACHE, _cache_key(city_name))
+        if cached is not None:
+            return orjson.dumps(cached).decode()
         try:
-            url = (
-                f"http://api.openweathermap.org/data/2.5/weather?q={city_name}"
-                f"&appid={OPENWEATHER_API_KEY}&units=metric"
-            )
-            response = requests.get(url, timeout=5)
+            url = "https://api.openweathermap.org/data/2.5/weather"
+            params = {
+                "q": city_name,
+                "appid": OPENWEATHER_API_KEY,
+                "units": "metric"
+            }
+
+            response = _HTTP.get(url, params=params, timeout=HTTP_TIMEOUT)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             weather_data = {
                 "temperature": data["main"]["temp"],
                 "description": data["weather"][0]["description"],
                 "humidity": data["main"]["humidity"],
                 "wind_speed": data["wind"]["speed"],
             }
-            return json.dumps(weather_data)
+            _cache_put(_WEATHER_CACHE, _cache_key(city_name), weather_data)
+            return orjson.dumps(weather_data).decode()
         except Exception as e:
             return f"Failed to fetch weather for {city_name}: {e}"
 
+    def _run_batch(self, city_names: list) -> str:
+        """
+        Fetches current weather for several cities concurrently; returns {city: weather-or-error}.
+        """
+        results = _fan_out(self._run, city_names)
+        return orjson.dumps({c: _decode_tool_result(r) for c, r in results.items()}).decode()
+
+
+class UnsplashBatchSearchTool(BaseTool):
+    name: str = "Unsplash Batch Image Search"
+    description: str = (
+        "Searches Unsplash for several destinations in one call. "
+        "Input: a JSON list of search queries, e.g. [\"Manali\", \"Goa beaches\"]. "
+        "Returns a JSON object mapping each query to its list of image URLs."
+    )
+
+    def _run(self, queries: str) -> str:
+        return UnsplashSearchTool()._run_batch(_parse_batch_input(queries))
+
+    async def _arun(self, queries: str) -> str:
+        results = await search_unsplash_async(_parse_batch_input(queries))
+        return orjson.dumps(results).decode()
+
+
+class OpenWeatherBatchTool(BaseTool):
+    name: str = "OpenWeather Batch Tool"
+    description: str = (
+        "Fetches current weather for several cities in one call. "
+        "Input: a JSON list of city names, e.g. [\"Manali\", \"Goa\"]. "
+        "Returns a JSON object mapping each city to its weather data."
+    )
+
+    def _run(self, city_names: str) -> str:
+        return OpenWeatherTool()._run_batch(_parse_batch_input(city_names))
+
+
+# ----------------------------
+# Async fan-out helpers
+# ----------------------------
+async def _fetch_unsplash_async(client: httpx.AsyncClient, query: str):
+    """
+    Async twin of UnsplashSearchTool._run; returns a list of URLs or an error string.
+    """
+    if not UNSPLASH_ACCESS_KEY:
+        return "Unsplash API key not configured. Cannot search images."
+    if not _cache_key(query or ""):
+        return "No search query provided."
+    cached = _unsplash_cache_get(_cache_key(query))
+    if cached is not None:
+        return orjson.loads(cached)
+    try:
+        response = await client.get(
+            "https://api.unsplash.com/search/photos",
+            params={"query": query, "per_page": 6, "client_id": UNSPLASH_ACCESS_KEY},
+        )
+        response.raise_for_status()
+        image_urls = _extract_unsplash_urls(response.content)
+        if not image_urls:
+            return "No images found for the query."
+        _unsplash_cache_put(_cache_key(query), orjson.dumps(image_urls).decode())
+        return image_urls
+    except httpx.TimeoutException:
+        return UNSPLASH_UNAVAILABLE
+    except Exception as e:
+        return f"An error occurred while searching Unsplash: {e}"
+
+
+async def _fetch_weather_async(client: httpx.AsyncClient, city_name: str):
+    """
+    Async twin of OpenWeatherTool._run; returns a weather dict or an error string.
+    """
+    if not OPENWEATHER_API_KEY:
+        return "OpenWeather API key not found. Cannot fetch weather."
+    cached = _cache_get(_WEATHER_CACHE, _cache_key(city_name))
+    if cached is not None:
+        return dict(cached)
+    try:
+        response = await client.get(
+            "https://api.openweathermap.org/data/2.5/weather",
+            params={"q": city_name, "appid": OPENWEATHER_API_KEY, "units": "metric"},
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        weather_data = {
+            "temperature": data["main"]["temp"],
+            "description": data["weather"][0]["description"],
+            "humidity": data["main"]["humidity"],
+            "wind_speed": data["wind"]["speed"],
+        }
+        _cache_put(_WEATHER_CACHE, _cache_key(city_name), weather_data)
+        return dict(weather_data)
+    except Exception as e:
+        return f"Failed to fetch weather for {city_name}: {e}"
+
+
+# One pooled AsyncClient per event loop: a client can't be shared across loops, but every
+# fan-out on the same loop (all API requests) reuses its keep-alive connections.
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+
+def _async_http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT[1], connect=HTTP_TIMEOUT[0]),
+            limits=httpx.Limits(max_connections=TOOL_MAX_WORKERS * 4,
+                                max_keepalive_connections=TOOL_MAX_WORKERS * 2),
+        )
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
+async def close_async_http_client():
+    """Closes the running loop's pooled client; call on app shutdown."""
+    client = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def search_unsplash_async(queries: list) -> dict:
+    """
+    Searches Unsplash for every query concurrently over one pooled client; queries sharing a
+    cache key are fetched once. Returns {query: urls-or-error}.
+    """
+    unique = {}
+    for query in queries:
+        unique.setdefault(_cache_key(query or ""), query)
+    client = _async_http_client()
+    found = await asyncio.gather(*(_fetch_unsplash_async(client, q) for q in unique.values()))
+    results = dict(zip(unique, found))
+    return {query: results[_cache_key(query or "")] for query in queries}
+
+
+async def fetch_place_media_async(places: list) -> dict:
+    """
+    Fetches photos and current weather for every place concurrently over one pooled client.
+    Returns {place: {"photos": ..., "weather": ...}}.
+    """
+    client = _async_http_client()
+    photos, weather = await asyncio.gather(
+        asyncio.gather(*(_fetch_unsplash_async(client, p) for p in places)),
+        asyncio.gather(*(_fetch_weather_async(client, p) for p in places)),
+    )
+    return {
+        place: {"photos": photos[i], "weather": weather[i]}
+        for i, place in enumerate(places)
+    }
+
 
 # ----------------------------
 # Agents
 # ----------------------------
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+
+
 class TripAgents:
     def __init__(self):
         self.llm = LLM(
             model="gemini/gemini-2.0-flash",
-            temperature=0.1
+            temperature=LLM_TEMPERATURE
         )
-        st.write("DEBUG — LLM initialized", self.llm)
+        _dbg("DEBUG — LLM initialized", self.llm)
         self.unsplash_tool = UnsplashSearchTool()
         self.openweather_tool = OpenWeatherTool()
+        self.unsplash_batch_tool = UnsplashBatchSearchTool()
+        self.openweather_batch_tool = OpenWeatherBatchTool()
 
+    @cached_property
     def city_selector_agent(self):
         return Agent(
             role='Indian Travel Destination Expert',
@@ -104,290 +484,471 @@ class TripAgents:
                 "this expert helps travelers discover both iconic and lesser-known gems across India tailored to their interests, and provides visual and weather-related inspiration for their trip."
             ),
             llm=self.llm,
-            verbose=True,
-            tools=[self.unsplash_tool, self.openweather_tool]
+            verbose=VERBOSE,
+            tools=[self.unsplash_batch_tool, self.openweather_batch_tool,
+                   self.unsplash_tool, self.openweather_tool]
         )
 
+    @cached_property
     def local_expert_agent(self):
         return Agent(
             role='Local Indian Travel Expert',
             goal='Provide insights about selected places: attractions, local traditions, cuisines, festivals, hidden gems.',
             backstory="A seasoned local guide across India.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
+    @cached_property
     def trip_scheduler_agent(self):
         return Agent(
             role="Indian Trip Itinerary Planner",
             goal="Organize selected attractions, food, and experiences into a day-wise schedule.",
             backstory="An experienced Indian travel coordinator.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
     # NEW
+    @cached_property
     def safety_info_agent(self):
         return Agent(
             role="Travel Safety Analyst",
             goal="Summarize destination-specific safety guidance, local norms, health notes, and emergency contacts.",
             backstory="A cautious analyst compiling safety practices for Indian destinations.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
+    @cached_property
     def packing_list_agent(self):
         return Agent(
             role="Packing List Generator",
             goal="Create a tailored packing list by season, activities, duration, and group needs.",
             backstory="A practical packer who hates overpacking.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
+    @cached_property
     def budget_advisor_agent(self):
         return Agent(
             role="Budget Allocation Advisor",
             goal="Translate total budget into category ranges and per-day estimates based on trip style and destination costs.",
             backstory="A frugal traveler who knows what things usually cost in India.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
+    @cached_property
     def transport_agent(self):
         return Agent(
             role="Transport Options Expert",
             goal="Recommend intercity and in-city transport options with time, cost and suitability.",
             backstory="Knows Indian rail, flights, buses, metros, autos, and cabs.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
+    @cached_property
     def stay_advisor_agent(self):
         return Agent(
             role="Accommodation Curator",
             goal="Propose stay options (budget → premium) with area, vibe, and approximate prices.",
             backstory="A stay matcher with strong sense of neighborhood fit.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
+    @cached_property
     def reviews_agent(self):
         return Agent(
             role="Review & Ratings Summarizer",
             goal="Synthesize likely pros/cons and average sentiment for attractions and eateries based on common patterns.",
             backstory="Aggregates user feedback patterns and typical traveler sentiment.",
             llm=self.llm,
-            verbose=True
+            verbose=VERBOSE
         )
 
 
+@cache
+def get_trip_agents() -> TripAgents:
+    """
+    One TripAgents per process, so the LLM settings and tools are built once. Its agents are
+    templates: crewai keeps the running crew and executor on the Agent, and one executor can't
+    run twice at once, so kickoffs use a copy from _crew_agent() rather than these instances.
+    """
+    return TripAgents()
+
+
+def _crew_agent(name: str) -> Agent:
+    """
+    A private copy of one TripAgents agent for a single crew kickoff (~1 ms). The copy gets its
+    own executor and LLM wrapper (so streaming can be switched on per copy) and shares the tools.
+    """
+    return getattr(get_trip_agents(), name).copy()
+
+
 # ----------------------------
 # Tasks
 # ----------------------------
+# Structured outputs for the feature tasks. crewai hands these to the LLM as the response
+# schema, so the prompts no longer need to embed pretty-printed JSON examples.
+class Attraction(BaseModel):
+    name: str = ""
+    description: str = ""
+    category: str = Field("", description="Historical|Natural|Cultural|Spiritual|Adventure|Other")
+    why_visit: str = ""
+    best_time_of_day: str = ""
+
+
+class Cuisine(BaseModel):
+    dish: str = ""
+    description: str = ""
+    recommended_places: List[str] = []
+
+
+class CityResearch(BaseModel):
+    top_attractions: List[Attraction] = []
+    local_cuisine: List[Cuisine] = []
+
+
+class StepOption(BaseModel):
+    name: Optional[str] = None
+    location: Optional[str] = None
+    price_range: Optional[str] = None
+    rating: Optional[float] = None
+    cuisines_served: Optional[List[str]] = None
+    mode: Optional[str] = None
+    time: Optional[str] = None
+    cost: Optional[str] = None
+    arrival_time: Optional[str] = None
+    depart_time: Optional[str] = None
+
+
+class ItineraryStep(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    type: str = Field(description="spot|accommodation|restaurant|cuisine|break|travel")
+    # spot
+    name: Optional[str] = None
+    category: Optional[str] = None
+    visit_time: Optional[str] = None
+    must_visit_time: Optional[str] = None
+    reason: Optional[str] = None
+    arrival_time: Optional[str] = None
+    depart_time: Optional[str] = None
+    # accommodation / restaurant / travel
+    options: Optional[List[StepOption]] = None
+    # cuisine
+    dish: Optional[str] = None
+    origin: Optional[str] = None
+    time_to_consume: Optional[str] = None
+    # break
+    duration: Optional[str] = None
+    activity: Optional[str] = None
+    # travel
+    from_: Optional[str] = Field(None, alias="from")
+    to: Optional[str] = None
+
+
+class ItineraryDay(BaseModel):
+    day: int
+    steps: List[ItineraryStep] = []
+
+
+class Itinerary(BaseModel):
+    itinerary: List[ItineraryDay] = []
+
+
+class NeighborhoodSafety(BaseModel):
+    area: str = ""
+    note: str = ""
+    best_time_to_visit: str = ""
+
+
+class HealthNotes(BaseModel):
+    food_water_safety: str = ""
+    mosquito_advice: str = ""
+    altitude_note: str = ""
+
+
+class EmergencyContacts(BaseModel):
+    all_emergencies: str = "112"
+    police: str = "100"
+    ambulance: str = "108"
+    fire: str = "101"
+
+
+class SafetyInfo(BaseModel):
+    overall_risk_level: str = Field("", description="Low|Moderate|High")
+    common_scams: List[str] = []
+    neighborhood_safety: List[NeighborhoodSafety] = []
+    local_laws_and_norms: List[str] = []
+    health: HealthNotes = HealthNotes()
+    emergency_contacts: EmergencyContacts = EmergencyContacts()
+    solo_travel_tips: List[str] = []
+
+
+class PackingItem(BaseModel):
+    item: str = ""
+    why: str = ""
+    qty: str = ""
+
+
+class PackingList(BaseModel):
+    season: str = Field("", description="Winter|Summer|Monsoon|Transitional")
+    essentials: List[PackingItem] = []
+    clothing: List[PackingItem] = []
+    footwear: List[PackingItem] = []
+    toiletries_health: List[PackingItem] = []
+    gadgets: List[PackingItem] = []
+    documents_money: List[PackingItem] = []
+    optional_activity_specific: List[PackingItem] = []
+
+
+class CategoryRanges(BaseModel):
+    transport: List[int] = Field([], description="[min, max] in ₹")
+    accommodation: List[int] = Field([], description="[min, max] in ₹")
+    food: List[int] = Field([], description="[min, max] in ₹")
+    entertainment: List[int] = Field([], description="[min, max] in ₹")
+
+
+class PerDayEstimate(BaseModel):
+    transport: str = ""
+    accommodation: str = ""
+    food: str = ""
+    entertainment: str = ""
+    total: str = ""
+
+
+class BudgetBreakdown(BaseModel):
+    budget_range: CategoryRanges = CategoryRanges()
+    per_day_estimate_per_person: PerDayEstimate = PerDayEstimate()
+    notes: List[str] = []
+
+
+class IntercityOption(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    mode: str = Field("", description="Flight|Train|Volvo Bus|Self-drive|Cab")
+    from_: str = Field("", alias="from", description="Common origin (generic)")
+    to: str = ""
+    time: str = Field("", description="e.g., 2h")
+    approx_cost: str = ""
+    pro_tip: str = ""
+
+
+class InCityOption(BaseModel):
+    mode: str = Field("", description="Metro|Local Bus|Auto|Cab|Rental Scooter|Walk")
+    when_to_use: str = ""
+    approx_cost: str = ""
+    coverage: str = Field("", description="Area/neighborhood coverage")
+    pro_tip: str = ""
+
+
+class TransportOptions(BaseModel):
+    intercity: List[IntercityOption] = []
+    in_city: List[InCityOption] = []
+
+
+class Stay(BaseModel):
+    name: str = ""
+    type: str = Field("", description="Hostel|Budget Hotel|Boutique|Resort|Homestay|Heritage")
+    area: str = ""
+    approx_price_per_night: str = ""
+    suits: str = Field("", description="Solo|Couple|Family|Friends")
+    vibe: str = Field("", description="Calm|Nightlife|Scenic|Central|Heritage")
+    why: str = ""
+
+
+class Neighborhood(BaseModel):
+    name: str = ""
+    good_for: List[str] = []
+    avoid_if: List[str] = []
+
+
+class StaySuggestions(BaseModel):
+    stays: List[Stay] = []
+    neighborhoods: List[Neighborhood] = []
+
+
+class ReviewSummary(BaseModel):
+    name: str = ""
+    average_rating: Optional[float] = None
+    pros: List[str] = []
+    cons: List[str] = []
+    tip: str = ""
+
+
+class ReviewsSummary(BaseModel):
+    attractions: List[ReviewSummary] = []
+    restaurants: List[ReviewSummary] = []
+
+
+def _format_budget_range(value) -> str:
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return f"₹{value[0]}–{value[1]}"
+    return "N/A"
+
+
+def _format_prefs_block(inputs) -> str:
+    """
+    Renders the traveler-preferences block shared by every per-place task prompt,
+    kept compact since it is sent with each of them.
+    """
+    budget_range = inputs.get('budget_range') or {}
+    budget = ", ".join(
+        f"{category} {_format_budget_range(budget_range.get(category))}"
+        for category in ("transport", "accommodation", "food", "entertainment")
+    )
+    return (
+        "User Preferences:\n"
+        f"- Travel type: {inputs['travel_type']}\n"
+        f"- People: {inputs['no_of_people']} ({inputs['group_type']})\n"
+        f"- Duration: {inputs['duration']} days\n"
+        f"- Interests: {inputs['interests']}\n"
+        f"- Planning Style: {inputs.get('planning_style', 'Not specified')}\n"
+        f"- Budget: {budget}\n"
+        f"- Start Date: {inputs.get('start_date', 'Not provided')}"
+    )
+
+
+# Static part of the trip-scheduler prompt; only the placeholders change per call
+_SCHEDULE_TRIP_PROMPT = (
+    "{prefs}\n\n"
+    "Create a detailed travel itinerary for a trip to {place}.\n"
+    "- Selected Attractions: {attractions}\n"
+    "- Selected Cuisines: {cuisines}\n\n"
+    "Your job:\n"
+    "- Distribute attractions and cuisines across {duration} days.\n"
+    "- Consider budget, group type, and transit time between spots.\n"
+    "- Include variety across days and insert breaks.\n"
+    "- Add travel steps (mode/time/approx cost) between locations.\n\n"
+    "Return ONLY valid JSON."
+)
+
+# City selection prompt; preference values are filled in per request
+_CITY_SELECTION_PROMPT = (
+    "You are a travel planning expert. Based on the given user preferences:\n"
+    "Travel type: {travel_type}\n"
+    "Budget: {total_budget} (with ranges {budget_range})\n"
+    "Group: {group_type} ({no_of_people} people)\n"
+    "Duration: {duration} days\n"
+    "Interests: {interests}\n"
+    "Season/Start date: {start_date}\n"
+    "Planning style: {planning_style}\n\n"
+    "Suggest 4 possible travel destinations that best match the user's preferences.\n"
+    "Once you have picked all 4 destinations, call the **'Unsplash Batch Image Search' tool** ONCE with a JSON list of all the place names to get 3-5 high-quality photo URLs for each. Then, compile a detailed evaluation.\n"
+    "Include:\n"
+    "- place: Name of the destination\n"
+    "- reason: Why it matches the user's preferences\n"
+    "- weather_suitability: Best season/months and average temperature during that period\n"
+    "- travel_cost_estimate: Estimated round-trip cost for flight, train, and bus (in local currency)\n"
+    "- accommodation_range: Average per-night stay cost (budget–premium range)\n"
+    "- safety_rating: 'Low', 'Moderate', or 'High'\n"
+    "- accessibility: Summary of how to reach (nearest airport/railway, road quality)\n"
+    "- permit_required: 'Yes' or 'No', and details if yes\n"
+    "- photos: A list of 5-7 photo URLs returned **by the Unsplash tools**. You MUST NOT generate these URLs yourself.\n"
+    "Your final response MUST be ONLY the raw JSON array. Do NOT include any introductory text, commentary, or markdown formatting like ```json. Your entire output should start with '[' and end with ']'."
+)
+
+_CITY_SELECTION_EXPECTED_OUTPUT = (
+    "[\n"
+    "  {\n"
+    "    \"place\": \"Destination name\",\n"
+    "    \"reason\": \"Why it matches\",\n"
+    "    \"weather_suitability\": \"Best months, avg temp\",\n"
+    "    \"travel_cost_estimate\": {\n"
+    "       \"flight\": \"₹xxxx–₹xxxx\",\n"
+    "       \"train\": \"₹xxxx–₹xxxx\",\n"
+    "       \"bus\": \"₹xxxx–₹xxxx\"\n"
+    "    },\n"
+    "    \"accommodation_range\": \"₹xxxx–₹xxxx/night\",\n"
+    "    \"safety_rating\": \"Low/Moderate/High\",\n"
+    "    \"accessibility\": \"Nearest airport/railway, road condition\",\n"
+    "    \"permit_required\": \"Yes/No (details)\",\n"
+    "    \"photos\": [\"[https://images.unsplash.com/photo-a1b2c3d4-e5f6g7h8](https://images.unsplash.com/photo-a1b2c3d4-e5f6g7h8)\", \"[https://images.unsplash.com/photo-i9j8k7l6-m5n4o3p2](https://images.unsplash.com/photo-i9j8k7l6-m5n4o3p2)\"]\n"
+    "  }\n"
+    "]"
+)
+
+_CITY_PROMPT_FIELDS = (
+    "travel_type", "total_budget", "budget_range", "group_type", "no_of_people",
+    "duration", "interests", "start_date", "planning_style",
+)
+
+# City selection as a single plain LLM call (Tripcrew.run_fast): no tools, photos are added afterwards
+_CITY_DIRECT_PROMPT = (
+    "You are an Indian travel destination expert. Based on the given user preferences:\n"
+    "{prefs}\n\n"
+    "Suggest 4 possible travel destinations that best match the user's preferences.\n"
+    "For each destination include:\n"
+    "- place: Name of the destination\n"
+    "- reason: Why it matches the user's preferences\n"
+    "- weather_suitability: Best season/months and average temperature during that period\n"
+    "- travel_cost_estimate: Object with estimated round-trip flight, train and bus costs (in local currency)\n"
+    "- accommodation_range: Average per-night stay cost (budget–premium range)\n"
+    "- safety_rating: 'Low', 'Moderate', or 'High'\n"
+    "- accessibility: Summary of how to reach (nearest airport/railway, road quality)\n"
+    "- permit_required: 'Yes' or 'No', and details if yes\n"
+    "Do NOT include photos or URLs.\n"
+    "Your entire response MUST be ONLY the raw JSON array, starting with '[' and ending with ']'."
+)
+
+
 class Triptasks:
-    def __init__(self):
-        pass
+    def __init__(self, inputs=None):
+        # The preferences block is invariant for a Tripcrew, so render it once up front
+        self.inputs = inputs
+        self.prefs_block = _format_prefs_block(inputs) if inputs else None
+
+    def _prefs(self, inputs) -> str:
+        if self.prefs_block is not None and inputs is self.inputs:
+            return self.prefs_block
+        return _format_prefs_block(inputs)
 
     def city_selection_task(self, agent, preferences):
         """
         City Selection Task — now returns detailed evaluation info for each destination.
         Ensures pure JSON output for easy parsing downstream.
         """
-        prefs_text = f"""
-                    Travel type: {preferences.get('travel_type')}
-                    Budget: {preferences.get('total_budget')} (with ranges {preferences.get('budget_range')})
-                    Group: {preferences.get('group_type')} ({preferences.get('no_of_people')} people)
-                    Duration: {preferences.get('duration')} days
-                    Interests: {preferences.get('interests')}
-                    Season/Start date: {preferences.get('start_date')}
-                    Planning style: {preferences.get('planning_style')}
-                    """
         return Task(
-            description=(
-                f"You are a travel planning expert. Based on the given user preferences:\n"
-                f"{prefs_text}\n\n"
-                "Suggest 4 possible travel destinations that best match the user's preferences.\n"
-                "For each destination, first use the **'Unsplash Image Search' tool** to find 3-5 high-quality photo URLs. Then, compile a detailed evaluation.\n"
-                "Include:\n"
-                "- place: Name of the destination\n"
-                "- reason: Why it matches the user's preferences\n"
-                "- weather_suitability: Best season/months and average temperature during that period\n"
-                "- travel_cost_estimate: Estimated round-trip cost for flight, train, and bus (in local currency)\n"
-                "- accommodation_range: Average per-night stay cost (budget–premium range)\n"
-                "- safety_rating: 'Low', 'Moderate', or 'High'\n"
-                "- accessibility: Summary of how to reach (nearest airport/railway, road quality)\n"
-                "- permit_required: 'Yes' or 'No', and details if yes\n"
-                "- photos: A list of 5-7 photo URLs returned **by the unsplash_tool**. You MUST NOT generate these URLs yourself.\n"
-                "Your final response MUST be ONLY the raw JSON array. Do NOT include any introductory text, commentary, or markdown formatting like ```json. Your entire output should start with '[' and end with ']'."
+            description=_CITY_SELECTION_PROMPT.format_map(
+                {field: preferences.get(field) for field in _CITY_PROMPT_FIELDS}
             ),
             agent=agent,
-            expected_output=(
-                "[\n"
-                "  {\n"
-                "    \"place\": \"Destination name\",\n"
-                "    \"reason\": \"Why it matches\",\n"
-                "    \"weather_suitability\": \"Best months, avg temp\",\n"
-                "    \"travel_cost_estimate\": {\n"
-                "       \"flight\": \"₹xxxx–₹xxxx\",\n"
-                "       \"train\": \"₹xxxx–₹xxxx\",\n"
-                "       \"bus\": \"₹xxxx–₹xxxx\"\n"
-                "    },\n"
-                "    \"accommodation_range\": \"₹xxxx–₹xxxx/night\",\n"
-                "    \"safety_rating\": \"Low/Moderate/High\",\n"
-                "    \"accessibility\": \"Nearest airport/railway, road condition\",\n"
-                "    \"permit_required\": \"Yes/No (details)\",\n"
-                "    \"photos\": [\"[https://images.unsplash.com/photo-a1b2c3d4-e5f6g7h8](https://images.unsplash.com/photo-a1b2c3d4-e5f6g7h8)\", \"[https://images.unsplash.com/photo-i9j8k7l6-m5n4o3p2](https://images.unsplash.com/photo-i9j8k7l6-m5n4o3p2)\"]\n"
-                "  }\n"
-                "]"
-            )
+            expected_output=_CITY_SELECTION_EXPECTED_OUTPUT
         )
 
     def city_research_task(self, agent, inputs, place):
         return Task(
             name='city_research',
-            description=(f"""
-                Provide detailed inputs about {place} customized to the user.
-
-                User Preferences:
-                - Travel type: {inputs['travel_type']}
-                - People: {inputs['no_of_people']} ({inputs['group_type']})
-                - Duration: {inputs['duration']} days
-                - Interests: {inputs['interests']}
-                - Planning Style: {inputs.get('planning_style', 'Not specified')}
-                - Budget Breakdown:
-                  - Transport: ₹{inputs.get('budget_range', {}).get('transport', ('N/A', 'N/A'))}
-                  - Accommodation: ₹{inputs.get('budget_range', {}).get('accommodation', ('N/A', 'N/A'))}
-                  - Food: ₹{inputs.get('budget_range', {}).get('food', ('N/A', 'N/A'))}
-                  - Entertainment: ₹{inputs.get('budget_range', {}).get('entertainment', ('N/A', 'N/A'))}
-                - Start Date: {inputs.get('start_date', 'Not provided')}
-
-                Return ONLY JSON:
-                {{
-                  "top_attractions": [
-                    {{
-                      "name": "string",
-                      "description": "string",
-                      "category": "Historical|Natural|Cultural|Spiritual|Adventure|Other",
-                      "why_visit": "string",
-                      "best_time_of_day": "string"
-                    }}
-                  ],
-                  "local_cuisine": [
-                    {{
-                      "dish": "string",
-                      "description": "string",
-                      "recommended_places": ["string"]
-                    }}
-                  ]
-                }}
-            """),
+            description=(
+                f"{self._prefs(inputs)}\n\n"
+                f"Provide detailed inputs about {place} customized to the user.\n\n"
+                "Return ONLY JSON."
+            ),
             agent=agent,
+            output_pydantic=CityResearch,
             expected_output='{"top_attractions":[...],"local_cuisine":[...]}'
         )
 
-    def schedule_trip_task(self, agent, place, inputs, attractions, cuisines):
+    def schedule_trip_task(self, agent, place, inputs, attractions, cuisines, research_task=None):
+        # Synchronous on purpose: when the city research task runs in the same crew it must
+        # finish first, and its output becomes this task's context.
         return Task(
             name='trip_scheduling',
-            description=(f"""
-                Create a detailed travel itinerary for a trip to {place}.
-
-                - Travel type: {inputs['travel_type']}
-                - People: {inputs['no_of_people']} ({inputs['group_type']})
-                - Duration: {inputs['duration']} days
-                - Interests: {inputs['interests']}
-                - Planning Style: {inputs.get('planning_style', 'Not specified')}
-                - Budget Breakdown:
-                  - Transport: ₹{inputs.get('budget_range', {}).get('transport', ('N/A', 'N/A'))}
-                  - Accommodation: ₹{inputs.get('budget_range', {}).get('accommodation', ('N/A', 'N/A'))}
-                  - Food: ₹{inputs.get('budget_range', {}).get('food', ('N/A', 'N/A'))}
-                  - Entertainment: ₹{inputs.get('budget_range', {}).get('entertainment', ('N/A', 'N/A'))}
-                - Start Date: {inputs.get('start_date', 'Not provided')}
-                - Selected Place: {place}
-                - Selected Attractions: {", ".join(attractions)}
-                - Selected Cuisines: {", ".join(cuisines)}
-
-                Your job:
-                - Distribute attractions and cuisines across {inputs["duration"]} days.
-                - Consider budget, group type, and transit time between spots.
-                - Include variety across days and insert breaks.
-                - Add travel steps (mode/time/approx cost) between locations.
-
-                Return ONLY valid JSON in this structure:
-                {{
-                  "itinerary": [
-                    {{
-                      "day": <int>,
-                      "steps": [
-                        {{
-                          "type": "spot",
-                          "name": <string>,
-                          "category": <string>,
-                          "visit_time": <string>,
-                          "must_visit_time": <string>,
-                          "reason": <string>,
-                          "arrival_time": <string>,
-                          "depart_time": <string>
-                        }},
-                        {{
-                          "type": "accommodation",
-                          "options": [
-                            {{
-                              "name": <string>,
-                              "location": <string>,
-                              "price_range": <string>,
-                              "rating": <float>,
-                              "arrival_time": <string>,
-                              "depart_time": <string>
-                            }}
-                          ]
-                        }},
-                        {{
-                          "type": "restaurant",
-                          "options": [
-                            {{
-                              "name": <string>,
-                              "location": <string>,
-                              "rating": <float>,
-                              "cuisines_served": [<string>],
-                              "arrival_time": <string>,
-                              "depart_time": <string>
-                            }}
-                          ]
-                        }},
-                        {{
-                          "type": "cuisine",
-                          "dish": <string>,
-                          "origin": <string>,
-                          "time_to_consume": <string>
-                        }},
-                        {{
-                          "type": "break",
-                          "duration": <string>,
-                          "activity": <string>,
-                          "arrival_time": <string>,
-                          "depart_time": <string>
-                        }},
-                        {{
-                          "type": "travel",
-                          "from": <string>,
-                          "to": <string>,
-                          "options": [
-                            {{
-                              "mode": <string>,
-                              "time": <string>,
-                              "cost": <string>,
-                              "arrival_time": <string>,
-                              "depart_time": <string>
-                            }}
-                          ]
-                        }}
-                      ]
-                    }}
-                  ]
-                }}
-            """),
+            description=_SCHEDULE_TRIP_PROMPT.format(
+                place=place,
+                prefs=self._prefs(inputs),
+                attractions=", ".join(attractions),
+                cuisines=", ".join(cuisines),
+                duration=inputs["duration"],
+            ),
             agent=agent,
+            context=[research_task] if research_task else None,
+            output_pydantic=Itinerary,
             expected_output="{'itinerary':[...]}"
         )
 
@@ -396,219 +957,82 @@ class Triptasks:
     def safety_info_task(self, agent, inputs, place):
         return Task(
             name="safety_information",
-            description=(f"""
-                Provide concise safety guidance for {place} tailored to this traveler.
-
-                Context:
-                - Travel type: {inputs['travel_type']}
-                - Group: {inputs['no_of_people']} ({inputs['group_type']})
-                - Duration: {inputs['duration']} days
-                - Interests: {inputs['interests']}
-                - Start Date: {inputs.get('start_date', 'Not provided')}
-
-                Return ONLY JSON:
-                {{
-                  "overall_risk_level": "Low|Moderate|High",
-                  "common_scams": ["string"],
-                  "neighborhood_safety": [
-                    {{
-                      "area": "string",
-                      "note": "string",
-                      "best_time_to_visit": "string"
-                    }}
-                  ],
-                  "local_laws_and_norms": ["string"],
-                  "health": {{
-                    "food_water_safety": "string",
-                    "mosquito_advice": "string",
-                    "altitude_note": "string"
-                  }},
-                  "emergency_contacts": {{
-                    "all_emergencies": "112",
-                    "police": "100",
-                    "ambulance": "108",
-                    "fire": "101"
-                  }},
-                  "solo_travel_tips": ["string"]
-                }}
-            """),
+            description=(
+                f"{self._prefs(inputs)}\n\n"
+                f"Provide concise safety guidance for {place} tailored to this traveler.\n\n"
+                "Return ONLY JSON."
+            ),
             agent=agent,
+            output_pydantic=SafetyInfo,
             expected_output='{"overall_risk_level":"...",...}'
         )
 
     def packing_list_task(self, agent, inputs, place):
         return Task(
             name="packing_list",
-            description=(f"""
-                Generate a practical packing list for {place}.
-
-                Inputs:
-                - Duration: {inputs['duration']} days
-                - Interests: {inputs['interests']}
-                - Group Type: {inputs['group_type']}
-                - Start Date: {inputs.get('start_date', 'Not provided')} (infer likely season for {place})
-                - Travel Type: {inputs['travel_type']}
-
-                Return ONLY JSON:
-                {{
-                  "season": "Winter|Summer|Monsoon|Transitional",
-                  "essentials": [{{"item":"string","why":"string","qty":"string"}}],
-                  "clothing": [{{"item":"string","why":"string","qty":"string"}}],
-                  "footwear": [{{"item":"string","why":"string","qty":"string"}}],
-                  "toiletries_health": [{{"item":"string","why":"string","qty":"string"}}],
-                  "gadgets": [{{"item":"string","why":"string","qty":"string"}}],
-                  "documents_money": [{{"item":"string","why":"string","qty":"string"}}],
-                  "optional_activity_specific": [{{"item":"string","why":"string","qty":"string"}}]
-                }}
-            """),
+            description=(
+                f"{self._prefs(inputs)}\n\n"
+                f"Generate a practical packing list for {place}.\n"
+                f"Infer the likely season at {place} from the start date.\n\n"
+                "Return ONLY JSON."
+            ),
             agent=agent,
+            output_pydantic=PackingList,
             expected_output='{"season":"...", "essentials":[...], ...}'
         )
 
     def budget_advisor_task(self, agent, inputs, place=None):
         return Task(
             name="dynamic_budget_handling",
-            description=(f"""
-                If total budget is given, allocate into ranges for transport, accommodation, food, entertainment.
-                If per-category is given, validate and add per-day estimates for {inputs['duration']} days and {inputs['no_of_people']} people.
-
-                Inputs:
-                - Total budget (optional): {inputs.get('total_budget')}
-                - Existing category ranges (optional): {inputs.get('budget_range')}
-                - Trip style: {inputs['travel_type']}
-                - Group type: {inputs['group_type']}
-                - People: {inputs['no_of_people']}
-                - Duration: {inputs['duration']} days
-                - Destination (optional): {place or 'Not specified'}
-
-                Return ONLY JSON:
-                {{
-                  "budget_range": {{
-                    "transport": ["min","max"],
-                    "accommodation": ["min","max"],
-                    "food": ["min","max"],
-                    "entertainment": ["min","max"]
-                  }},
-                  "per_day_estimate_per_person": {{
-                    "transport": "₹",
-                    "accommodation": "₹",
-                    "food": "₹",
-                    "entertainment": "₹",
-                    "total": "₹"
-                  }},
-                  "notes": ["string"]
-                }}
-            """),
+            description=(
+                "If total budget is given, allocate into ranges for transport, accommodation, food, entertainment.\n"
+                f"If per-category is given, validate and add per-day estimates for {inputs['duration']} days "
+                f"and {inputs['no_of_people']} people.\n\n"
+                f"{self._prefs(inputs)}\n"
+                f"- Total budget (optional): {inputs.get('total_budget')}\n"
+                f"- Destination (optional): {place or 'Not specified'}\n\n"
+                "Return ONLY JSON."
+            ),
             agent=agent,
+            output_pydantic=BudgetBreakdown,
             expected_output='{"budget_range":{...},"per_day_estimate_per_person":{...},"notes":[...]}'
         )
 
     def transport_options_task(self, agent, inputs, place):
         return Task(
             name="transport_options",
-            description=(f"""
-                Recommend intercity and in-city transport options for {place}.
-
-                User:
-                - Group: {inputs['no_of_people']} ({inputs['group_type']})
-                - Budget: {inputs.get('budget_range')}
-                - Duration: {inputs['duration']} days
-                - Travel Type: {inputs['travel_type']}
-
-                Return ONLY JSON:
-                {{
-                  "intercity": [
-                    {{
-                      "mode": "Flight|Train|Volvo Bus|Self-drive|Cab",
-                      "from": "Common origin (generic)",
-                      "to": "{place}",
-                      "time": "e.g., 2h",
-                      "approx_cost": "₹",
-                      "pro_tip": "string"
-                    }}
-                  ],
-                  "in_city": [
-                    {{
-                      "mode": "Metro|Local Bus|Auto|Cab|Rental Scooter|Walk",
-                      "when_to_use": "string",
-                      "approx_cost": "₹",
-                      "coverage": "Area/neighborhood coverage",
-                      "pro_tip": "string"
-                    }}
-                  ]
-                }}
-            """),
+            description=(
+                f"{self._prefs(inputs)}\n\n"
+                f"Recommend intercity and in-city transport options for {place}.\n\n"
+                f"Return ONLY JSON. For intercity options, \"to\" is {place}."
+            ),
             agent=agent,
+            output_pydantic=TransportOptions,
             expected_output='{"intercity":[...],"in_city":[...]}'
         )
 
     def stay_advisor_task(self, agent, inputs, place):
         return Task(
             name="accommodation_suggestions",
-            description=(f"""
-                Propose accommodation options in {place} across budget tiers.
-
-                User:
-                - People: {inputs['no_of_people']} ({inputs['group_type']})
-                - Trip style: {inputs['travel_type']}
-                - Duration: {inputs['duration']} days
-                - Budget ranges: {inputs.get('budget_range')}
-
-                Return ONLY JSON:
-                {{
-                  "stays": [
-                    {{
-                      "name": "string",
-                      "type": "Hostel|Budget Hotel|Boutique|Resort|Homestay|Heritage",
-                      "area": "string",
-                      "approx_price_per_night": "₹",
-                      "suits": "Solo|Couple|Family|Friends",
-                      "vibe": "Calm|Nightlife|Scenic|Central|Heritage",
-                      "why": "string"
-                    }}
-                  ],
-                  "neighborhoods": [
-                    {{
-                      "name": "string",
-                      "good_for": ["string"],
-                      "avoid_if": ["string"]
-                    }}
-                  ]
-                }}
-            """),
+            description=(
+                f"{self._prefs(inputs)}\n\n"
+                f"Propose accommodation options in {place} across budget tiers.\n\n"
+                "Return ONLY JSON."
+            ),
             agent=agent,
+            output_pydantic=StaySuggestions,
             expected_output='{"stays":[...],"neighborhoods":[...]}'
         )
 
-    def reviews_task(self, agent, place):
+    def reviews_task(self, agent, inputs, place):
         return Task(
             name="reviews_and_ratings",
-            description=(f"""
-                Summarize likely reviews & ratings patterns for {place} (typical traveler sentiment).
-
-                Return ONLY JSON:
-                {{
-                  "attractions": [
-                    {{
-                      "name": "string",
-                      "average_rating": 4.3,
-                      "pros": ["string"],
-                      "cons": ["string"],
-                      "tip": "string"
-                    }}
-                  ],
-                  "restaurants": [
-                    {{
-                      "name": "string",
-                      "average_rating": 4.2,
-                      "pros": ["string"],
-                      "cons": ["string"],
-                      "tip": "string"
-                    }}
-                  ]
-                }}
-            """),
+            description=(
+                f"Summarize likely reviews & ratings patterns for {place} (typical traveler sentiment).\n\n"
+                "Return ONLY JSON."
+            ),
             agent=agent,
+            output_pydantic=ReviewsSummary,
             expected_output='{"attractions":[...],"restaurants":[...]}'
         )
 
@@ -616,59 +1040,300 @@ class Triptasks:
 # ----------------------------
 # Orchestration
 # ----------------------------
+# Default (low, high) share of total_budget per category, in percent
+BUDGET_SPLIT_PERCENT = {
+    "transport": (25, 35),
+    "accommodation": (35, 45),
+    "food": (15, 25),
+    "entertainment": (5, 15),
+}
+
+# How long a crew's raw output is reused for identical (feature, inputs, place) calls:
+# fast-changing advice expires sooner than packing/budget guidance
+CREW_CACHE_TTL_SECONDS = {
+    "city_selection": 3600,
+    "city_selection_direct": 3600,
+    "local_info": 6 * 3600,
+    "schedule": 6 * 3600,
+    "safety": 3600,
+    "transport": 3600,
+    "packing": 24 * 3600,
+    "budget": 24 * 3600,
+    "accommodation": 6 * 3600,
+    "reviews": 6 * 3600,
+    "pipeline": 3600,
+}
+
+# Above this temperature, repeated calls are expected to differ, so crew outputs aren't reused
+CREW_CACHE_MAX_TEMPERATURE = 0.3
+_CREW_CACHE_STATS = {"hits": 0, "misses": 0, "joined": 0, "response_hits": 0}
+# Crew runs in progress, by cache key: identical calls that miss while one is running wait
+# for its result instead of starting their own LLM call
+_CREW_INFLIGHT = {}
+
+
+def _normalize_inputs(inputs) -> dict:
+    """
+    Copies the trip inputs with sorted keys (budget_range included), so prompt text and
+    cache keys don't depend on the order in which the caller built the dict.
+    """
+    normalized = dict(sorted(inputs.items()))
+    if isinstance(normalized.get("budget_range"), dict):
+        normalized["budget_range"] = dict(sorted(normalized["budget_range"].items()))
+    return normalized
+
+
+def _crew_cache_key(feature: str, inputs_key: bytes, args) -> str:
+    digest = hashlib.blake2b(inputs_key, digest_size=16)
+    digest.update(orjson.dumps([feature, args], option=orjson.OPT_SORT_KEYS, default=str))
+    return digest.hexdigest()
+
+
+_EMPTY_OUTPUTS = frozenset({"No output", "", "[]", "{}"})
+
+
+def _is_no_output(result) -> bool:
+    """
+    True for results not worth caching: "No output", and empty text, JSON, lists or dicts
+    (a dict counts as empty when every value is).
+    """
+    if isinstance(result, str):
+        return result.strip() in _EMPTY_OUTPUTS
+    if isinstance(result, dict):
+        return all(_is_no_output(value) for value in result.values())
+    return isinstance(result, list) and not result
+
+
+def _cached_crew_output(feature: str):
+    """
+    Memoizes a Tripcrew run_* method's raw output in _CREW_CACHE, keyed on the feature,
+    the serialized trip inputs and the call arguments. Concurrent identical misses share a
+    single run. "No output" results are not cached, and nothing is cached when the LLM runs
+    above CREW_CACHE_MAX_TEMPERATURE.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if LLM_TEMPERATURE > CREW_CACHE_MAX_TEMPERATURE:
+                return fn(self, *args, **kwargs)
+            key = _crew_cache_key(feature, self.inputs_key, [args, kwargs])
+            cached = _cache_get(_CREW_CACHE, key, CREW_CACHE_TTL_SECONDS[feature])
+            with _CACHE_LOCK:
+                pending = None if cached is not None else _CREW_INFLIGHT.get(key)
+                leader = cached is None and pending is None
+                if leader:
+                    pending = _CREW_INFLIGHT[key] = Future()
+                _CREW_CACHE_STATS["misses" if leader else "hits" if cached is not None else "joined"] += 1
+            if cached is not None:
+                _dbg(f"DEBUG — [{feature}] served from cache")
+                return cached
+            if not leader:
+                _dbg(f"DEBUG — [{feature}] waiting on identical in-flight run")
+                return pending.result()
+            try:
+                result = fn(self, *args, **kwargs)
+                if not _is_no_output(result):
+                    _cache_put(_CREW_CACHE, key, result)
+                pending.set_result(result)
+                return result
+            except BaseException as e:
+                pending.set_exception(e)
+                raise
+            finally:
+                with _CACHE_LOCK:
+                    _CREW_INFLIGHT.pop(key, None)
+        return wrapper
+    return decorator
+
+
+def crew_cache_stats() -> dict:
+    """
+    Hit/miss counts (plus calls that joined an in-flight run) and size of the crew output cache.
+    Requests answered from the response-body cache never reach it; they are counted apart.
+    """
+    with _CACHE_LOCK:
+        hits, misses, joined, response_hits = (
+            _CREW_CACHE_STATS[k] for k in ("hits", "misses", "joined", "response_hits")
+        )
+        entries = len(_CREW_CACHE)
+        response_entries = len(_RESPONSE_CACHE)
+    lookups = hits + misses + joined
+    return {
+        "hits": hits,
+        "misses": misses,
+        "joined": joined,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        "entries": entries,
+        "response_hits": response_hits,
+        "response_entries": response_entries,
+        "enabled": LLM_TEMPERATURE <= CREW_CACHE_MAX_TEMPERATURE,
+    }
+
+
+# Rendered JSON bodies of API responses built from crew output, under the same keys and TTLs as
+# _CREW_CACHE, so a repeat request is answered with stored bytes instead of re-formatting and
+# re-encoding an identical result
+_RESPONSE_CACHE = {}
+
+
+def cached_response_body(feature: str, inputs_key: bytes, args):
+    """JSON body kept by store_response_body for this feature, trip inputs and arguments, or None."""
+    if LLM_TEMPERATURE > CREW_CACHE_MAX_TEMPERATURE:
+        return None
+    body = _cache_get(_RESPONSE_CACHE, _crew_cache_key(feature, inputs_key, args), CREW_CACHE_TTL_SECONDS[feature])
+    if body is not None:
+        with _CACHE_LOCK:
+            _CREW_CACHE_STATS["response_hits"] += 1
+    return body
+
+
+def store_response_body(feature: str, inputs_key: bytes, args, raw, body: bytes):
+    """Keeps a rendered response body for cached_response_body; "No output" results are skipped."""
+    if LLM_TEMPERATURE <= CREW_CACHE_MAX_TEMPERATURE and not _is_no_output(raw):
+        _cache_put(_RESPONSE_CACHE, _crew_cache_key(feature, inputs_key, args), body)
+
+# Stands in for the destination when run_pipeline lets the city selection pick it
+PIPELINE_TOP_PICK = "the best-matching destination from the city suggestions in your context"
+PIPELINE_STAGES = ("places", "local_info", "schedule")
+
+# Cap on crew kickoffs in flight across all async callers (API requests, fan-outs), to stay
+# inside the Gemini rate limit. A thread semaphore, since kickoffs run in worker threads and
+# callers may live on different event loops.
+CREW_MAX_CONCURRENCY = int(os.getenv("CREW_MAX_CONCURRENCY", "8"))
+_CREW_SLOTS = threading.BoundedSemaphore(CREW_MAX_CONCURRENCY)
+# Crews get their own pool, sized to the cap: asyncio's default executor can be smaller than
+# CREW_MAX_CONCURRENCY (min(32, cpus + 4)) and is shared with every other to_thread caller.
+# Every flow run here kicks off on its own _crew_agent() copy, never on the shared TripAgents.
+_CREW_EXECUTOR = ThreadPoolExecutor(max_workers=CREW_MAX_CONCURRENCY, thread_name_prefix="crew")
+
+
+def _with_crew_slot(fn, *args):
+    with _CREW_SLOTS:
+        return fn(*args)
+
+
+async def _in_crew_thread(fn, *args):
+    """Runs a blocking crew flow on the crew pool once a crew slot is free."""
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _CREW_EXECUTOR, ctx.run, _with_crew_slot, fn, *args
+    )
+
+
+def submit_crew(fn, *args) -> Future:
+    """
+    Starts a blocking crew flow in the background on the crew pool, under the same cap as the
+    async callers; for synchronous callers such as the Streamlit wizard's prefetches.
+    """
+    return _CREW_EXECUTOR.submit(contextvars.copy_context().run, _with_crew_slot, fn, *args)
+
+
+_STREAM_END = object()
+
+
+def _pump_stream(crew, loop, chunks, stop):
+    """
+    Crew-pool half of _stream_crew: iterates the streaming kickoff and hands each text chunk to
+    the event loop. Returns without kicking off if the consumer left while this job waited.
+    """
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+        except RuntimeError:  # the loop closed under a consumer that had already left
+            pass
+
+    try:
+        if stop.is_set():
+            return
+        for chunk in crew.kickoff():
+            if stop.is_set():
+                break
+            if chunk.chunk_type == StreamChunkType.TEXT and chunk.content:
+                put(chunk.content)
+    finally:
+        put(_STREAM_END)
+
+
+async def _stream_crew(agent, task):
+    """
+    Runs a one-task crew with streaming on and yields its text chunks. The kickoff goes through
+    submit_crew like every other crew, so it waits for a crew slot on the crew pool and holds it
+    until the crew finishes; crewai runs the kickoff itself on a thread of its own and feeds the
+    chunks to that pool thread. The agent must come from _crew_agent(): crewai enables
+    streaming on its LLM.
+    """
+    crew = Crew(agents=[agent], tasks=[task], verbose=VERBOSE, stream=True)
+    chunks = asyncio.Queue()
+    stop = threading.Event()
+    done = asyncio.wrap_future(submit_crew(_pump_stream, crew, asyncio.get_running_loop(), chunks, stop))
+    try:
+        while (chunk := await chunks.get()) is not _STREAM_END:
+            yield chunk
+        await done  # surfaces a failed kickoff
+    finally:
+        # A job still queued is dropped; one that already has a thread sees stop and
+        # returns (or finishes its crew) and gives its slot back
+        stop.set()
+        done.cancel()
+
+
+# Per-place feature -> (TripAgents agent, Triptasks factory); every factory takes (agent, inputs, place).
+PLACE_FEATURES = {
+    "local_info": ("local_expert_agent", "city_research_task"),
+    "safety": ("safety_info_agent", "safety_info_task"),
+    "packing": ("packing_list_agent", "packing_list_task"),
+    "budget": ("budget_advisor_agent", "budget_advisor_task"),
+    "transport": ("transport_agent", "transport_options_task"),
+    "accommodation": ("stay_advisor_agent", "stay_advisor_task"),
+    "reviews": ("reviews_agent", "reviews_task"),
+}
+
+# Features whose prompt works without a destination (run_budget_breakdown's place is optional)
+PLACE_OPTIONAL_FEATURES = {"budget"}
+
+
+def _is_place(place) -> bool:
+    """A usable destination: a non-blank string. Anything else never reaches the LLM."""
+    return isinstance(place, str) and bool(place.strip())
+
+
+def normalize_picks(picks) -> list:
+    """Selected attractions/cuisines, trimmed, de-duplicated and in a stable order."""
+    return sorted({pick.strip() for pick in picks or () if isinstance(pick, str) and pick.strip()})
+
+
 class Tripcrew:
     def __init__(self, inputs):
-        self.inputs = inputs
-        self.output = None
-        st.write("DEBUG — Tripcrew initialized with inputs", self.inputs)
+        self.inputs = _normalize_inputs(inputs)
+        _dbg("DEBUG — Tripcrew initialized with inputs", self.inputs)
 
         # Auto-split total budget if category ranges missing
         if (not self.inputs.get("budget_range") or
             all(v is None for v in self.inputs.get("budget_range", {}).values())) and self.inputs.get("total_budget"):
-            total = self.inputs["total_budget"]
+            total = int(self.inputs["total_budget"])
             split = {
-                "transport": (int(0.25 * total), int(0.35 * total)),
-                "accommodation": (int(0.35 * total), int(0.45 * total)),
-                "food": (int(0.15 * total), int(0.25 * total)),
-                "entertainment": (int(0.05 * total), int(0.15 * total)),
+                category: (total * low // 100, total * high // 100)
+                for category, (low, high) in BUDGET_SPLIT_PERCENT.items()
             }
             self.inputs["budget_range"] = split
 
-    # --- Weather helpers ---
-    def get_current_weather(self, city_name: str):
-        if not OPENWEATHER_API_KEY:
-            st.write("DEBUG — Tripcrew initialized with inputs:", self.inputs)
-            return None
-        try:
-            url = (
-                f"[http://api.openweathermap.org/data/2.5/weather?q=](http://api.openweathermap.org/data/2.5/weather?q=){city_name}"
-                f"&appid={OPENWEATHER_API_KEY}&units=metric"
-            )
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            st.write(f"DEBUG — Weather API raw response for {city_name}:", data)
-            return {
-                "temperature": data["main"]["temp"],
-                "description": data["weather"][0]["description"],
-                "humidity": data["main"]["humidity"],
-                "wind_speed": data["wind"]["speed"],
-            }
-        except Exception as e:
-            print(f"Failed to fetch weather for {city_name}: {e}")
-            return None
+        # Built after the budget split so the cached preferences block includes it
+        self.tasks = Triptasks(self.inputs)
+        # Serialized once; every cached run_* call hashes it into its cache key
+        self.inputs_key = orjson.dumps(self.inputs, option=orjson.OPT_SORT_KEYS, default=str)
 
+    # --- Weather helpers ---
     def should_show_weather(self) -> bool:
-        st.write("DEBUG — Checking whether to show weather...")
+        _dbg("DEBUG — Checking whether to show weather...")
         start_date_str = self.inputs.get("start_date")
         planning_style = self.inputs.get("planning_style")
         if not start_date_str or not planning_style:
             return False
         try:
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        except Exception:
+            start_date = date.fromisoformat(start_date_str)
+        except (TypeError, ValueError):
             return False
-        today = datetime.utcnow().date()
+        today = datetime.now(timezone.utc).date()
         days_until_trip = (start_date - today).days
         if planning_style == "holiday_based" and 0 <= days_until_trip <= 3:
             return True
@@ -676,183 +1341,410 @@ class Tripcrew:
 
     # --- Core flows already in your app ---
     def run(self):
-        st.write("DEBUG — [run] Starting city selection")
-        agents = TripAgents()
-        tasks = Triptasks()
+        raw = self._select_cities()
+        _dbg("DEBUG — Raw Task Output", raw)
+
+        formatted_places = FORMATTER.format_city_suggestions(raw)
+        _dbg("DEBUG — Formatted City Suggestions", formatted_places)
+
+        if self.should_show_weather():
+            _dbg("DEBUG — Weather display enabled")
+            # Same tool and cache the city selector used, so these are usually cache hits
+            cities = [place["place"] for place in formatted_places if place.get("place")]
+            weather_by_city = _fan_out(get_trip_agents().openweather_tool._run, cities)
+            for place in formatted_places:
+                weather = _decode_tool_result(weather_by_city.get(place.get("place"), ""))
+                place["weather"] = weather if isinstance(weather, dict) else {}
 
-        city_selector = agents.city_selector_agent()
-        st.write("DEBUG — Created city_selector_agent:", city_selector)
-        st.write("DEBUG — Agent description:", getattr(city_selector, "description", "N/A"))
-        st.write("DEBUG — Agent expected_output:", getattr(city_selector, "expected_output", "N/A"))
+        return formatted_places
+
+    @_cached_crew_output("city_selection")
+    def _select_cities(self):
+        _dbg("DEBUG — [run] Starting city selection")
+        tasks = self.tasks
+
+        city_selector = _crew_agent("city_selector_agent")
+        _dbg("DEBUG — Created city_selector_agent:", city_selector)
+        _dbg("DEBUG — Agent description:", getattr(city_selector, "description", "N/A"))
+        _dbg("DEBUG — Agent expected_output:", getattr(city_selector, "expected_output", "N/A"))
 
         select_cities = tasks.city_selection_task(city_selector, self.inputs)
-        st.write("DEBUG — Created city_selection_task", select_cities)
+        _dbg("DEBUG — Created city_selection_task", select_cities)
 
         crew = Crew(
             agents=[city_selector],
             tasks=[select_cities],
-            verbose=True
+            verbose=VERBOSE
         )
-        st.write("DEBUG — Crew created", crew)
+        _dbg("DEBUG — Crew created", crew)
 
         result = crew.kickoff()
-        st.write("DEBUG — Crew kickoff result", result)
-
-        if hasattr(result, "tasks_output"):
-            task_output = result.tasks_output[0].raw if result.tasks_output else "No output"
-            st.write("DEBUG — Raw Task Output", task_output)
-            self.output = task_output
-        else:
-            st.write("DEBUG — No output from crew")
-            self.output = "No output"
+        _dbg("DEBUG — Crew kickoff result", result)
+        return _first_task_raw(result)
+
+    @_cached_crew_output("city_selection_direct")
+    def _select_cities_direct(self):
+        _dbg("DEBUG — [run_fast] Starting direct city selection")
+        raw = get_trip_agents().llm.call(
+            _CITY_DIRECT_PROMPT.format(prefs=self.tasks._prefs(self.inputs))
+        )
+        _dbg("DEBUG — Direct LLM output", raw)
+        return raw if isinstance(raw, str) and raw.strip() else "No output"
 
-        formatter = format_data()
-        formatted_places = formatter.format_city_suggestions(self.output)
-        st.write("DEBUG — Formatted City Suggestions", formatted_places)
+    async def run_fast_async(self):
+        """
+        City suggestions from one Gemini call instead of the city selector's agent loop,
+        with photos (and weather, when shown) for all places fetched concurrently afterwards.
+        Same shape as run(); use run() when the agent should pick photos itself.
+        """
+        raw = await _in_crew_thread(self._select_cities_direct)
+        formatted_places = FORMATTER.format_city_suggestions(raw)
+        cities = [place["place"] for place in formatted_places if place.get("place")]
 
         if self.should_show_weather():
-            st.write("DEBUG — Weather display enabled")
-            for place in formatted_places:
-                city_name = place.get("place")
-                if city_name:
-                    weather = self.get_current_weather(city_name)
-                    place["weather"] = weather if weather else {}
-
-        self.output = formatted_places
-        return self.output
+            media = await fetch_place_media_async(cities)
+        else:
+            photos = await search_unsplash_async(cities)
+            media = {city: {"photos": urls} for city, urls in photos.items()}
+
+        for place in formatted_places:
+            found = media.get(place.get("place"), {})
+            place["photos"] = found["photos"] if isinstance(found.get("photos"), list) else []
+            if "weather" in found:
+                place["weather"] = found["weather"] if isinstance(found["weather"], dict) else {}
+        return formatted_places
+
+    def run_fast(self):
+        async def run():
+            try:
+                return await self.run_fast_async()
+            finally:
+                # asyncio.run's loop ends here, so its pooled client goes with it
+                await close_async_http_client()
+        return asyncio.run(run())
 
+    @_cached_crew_output("local_info")
     def run_local_expert(self, selected_place):
-        st.write(f"DEBUG — [run_local_expert] Starting for {selected_place}")
-        agents = TripAgents()
-        tasks = Triptasks()
-
-        local_expert = agents.local_expert_agent()
-        st.write("DEBUG — Created local_expert_agent:", local_expert)
+        return self._run_feature("local_info", selected_place)
 
-        research_task = tasks.city_research_task(local_expert, self.inputs, selected_place)
-        st.write("DEBUG — Created city_research_task:", research_task)
+    def run_schedule_trip(self, selected_place, selected_attractions, selected_cuisines):
+        # The picks come from checkboxes, so their order means nothing: normalized, the same
+        # selection in any order (or with repeats) shares one cached itinerary.
+        return self._schedule_trip(
+            selected_place, normalize_picks(selected_attractions), normalize_picks(selected_cuisines)
+        )
 
-        crew = Crew(agents=[local_expert], tasks=[research_task], verbose=True)
-        st.write("DEBUG — Crew created:", crew)
+    @_cached_crew_output("schedule")
+    def _schedule_trip(self, selected_place, selected_attractions, selected_cuisines):
+        _dbg(f"DEBUG — [run_schedule_trip] for {selected_place}")
+        if not _is_place(selected_place):
+            return "No output"
+        _dbg("DEBUG — Selected attractions:", selected_attractions)
+        _dbg("DEBUG — Selected cuisines:", selected_cuisines)
 
-        result = crew.kickoff()
-        st.write("DEBUG — Raw Crew result:", result)
+        tasks = self.tasks
 
-        if hasattr(result, "tasks_output") and result.tasks_output:
-            self.output = result.tasks_output[0].raw
-            st.write("DEBUG — Raw Task Output:", self.output)
-        else:
-            self.output = "No output"
-        return self.output
+        scheduling_expert = _crew_agent("trip_scheduler_agent")
+        _dbg("DEBUG — Created trip_scheduler_agent:", scheduling_expert)
 
-    def run_schedule_trip(self, selected_place, selected_attractions, selected_cuisines):
-        st.write(f"DEBUG — [run_schedule_trip] for {selected_place}")
-        st.write("DEBUG — Selected attractions:", selected_attractions)
-        st.write("DEBUG — Selected cuisines:", selected_cuisines)
+        schedule_task = tasks.schedule_trip_task(
+            scheduling_expert, selected_place, self.inputs, selected_attractions, selected_cuisines
+        )
+        _dbg("DEBUG — Created schedule_trip_task:", schedule_task)
 
-        agents = TripAgents()
-        tasks = Triptasks()
+        crew = Crew(agents=[scheduling_expert], tasks=[schedule_task], verbose=VERBOSE)
+        result = crew.kickoff()
+        _dbg("DEBUG — Raw Crew result:", result)
 
-        scheduling_expert = agents.trip_scheduler_agent()
-        st.write("DEBUG — Created trip_scheduler_agent:", scheduling_expert)
+        # Already validated against Itinerary, so format_trip_schedule passes it straight through
+        output = _first_task_structured(result)
+        _dbg("DEBUG — Task Output:", output)
+        return output
 
-        schedule_task = tasks.schedule_trip_task(
-            scheduling_expert, selected_place, self.inputs, selected_attractions, selected_cuisines
+    @_cached_crew_output("pipeline")
+    def run_pipeline(self, selected_place=None):
+        """
+        Runs city selection, city research and scheduling as one sequential Crew kickoff,
+        each task reading the earlier outputs as context. Without a selected place the
+        research and schedule cover the top city suggestion. For non-interactive callers;
+        the UI keeps the staged run/run_local_expert/run_schedule_trip flow.
+        Returns {"places", "local_info", "schedule"} raw outputs.
+        """
+        _dbg(f"DEBUG — [run_pipeline] for {selected_place}")
+        if selected_place is not None and not _is_place(selected_place):
+            return {stage: "No output" for stage in PIPELINE_STAGES}
+        place = selected_place or PIPELINE_TOP_PICK
+        tasks = self.tasks
+
+        select_cities = tasks.city_selection_task(_crew_agent("city_selector_agent"), self.inputs)
+        research = tasks.city_research_task(_crew_agent("local_expert_agent"), self.inputs, place)
+        research.context = [select_cities]
+        # The only task that shares a crew; the synchronous schedule task waits for its output
+        research.async_execution = True
+        schedule = tasks.schedule_trip_task(
+            _crew_agent("trip_scheduler_agent"), place, self.inputs,
+            ["the top attractions from the city research"],
+            ["the local cuisine from the city research"],
+            research_task=research,
         )
-        st.write("DEBUG — Created schedule_trip_task:", schedule_task)
+        schedule.context = [select_cities, research]
 
-        crew = Crew(agents=[scheduling_expert], tasks=[schedule_task], verbose=True)
+        crew = Crew(
+            agents=[select_cities.agent, research.agent, schedule.agent],
+            tasks=[select_cities, research, schedule],
+            process=Process.sequential,
+            verbose=VERBOSE
+        )
         result = crew.kickoff()
-        st.write("DEBUG — Raw Crew result:", result)
+        _dbg("DEBUG — Raw result:", result)
 
-        if hasattr(result, "tasks_output") and result.tasks_output:
-            self.output = result.tasks_output[0].raw
-            st.write("DEBUG — Raw Task Output:", self.output)
-        else:
-            self.output = "No output"
-        return self.output
+        outputs = getattr(result, "tasks_output", None) or []
+        return {
+            stage: (outputs[i].raw if i < len(outputs) else "No output")
+            for i, stage in enumerate(PIPELINE_STAGES)
+        }
 
     # --- NEW feature flows (call these from your API endpoints) ---
+    @_cached_crew_output("safety")
     def run_safety_info(self, selected_place):
-        st.write(f"DEBUG — [run_safety_info] for {selected_place}")
-        agents = TripAgents()
-        tasks = Triptasks()
-        agent = agents.safety_info_agent()
-        task = tasks.safety_info_task(agent, self.inputs, selected_place)
-        crew = Crew(agents=[agent], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        st.write("DEBUG — Raw result:", result)
-        return result.tasks_output[0].raw if hasattr(result, "tasks_output") else "No output"
+        return self._run_feature("safety", selected_place)
 
+    @_cached_crew_output("packing")
     def run_packing_list(self, selected_place):
-        st.write(f"DEBUG — [run_packing_list] for {selected_place}")
-        agents = TripAgents()
-        tasks = Triptasks()
-        agent = agents.packing_list_agent()
-        task = tasks.packing_list_task(agent, self.inputs, selected_place)
-        crew = Crew(agents=[agent], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        st.write("DEBUG — Raw result:", result)
-        return result.tasks_output[0].raw if hasattr(result, "tasks_output") else "No output"
+        return self._run_feature("packing", selected_place)
 
+    @_cached_crew_output("budget")
     def run_budget_breakdown(self, selected_place=None):
-        st.write(f"DEBUG — [run_budget_breakdown] for {selected_place}")
-        agents = TripAgents()
-        tasks = Triptasks()
-        agent = agents.budget_advisor_agent()
-        task = tasks.budget_advisor_task(agent, self.inputs, selected_place)
-        crew = Crew(agents=[agent], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        st.write("DEBUG — Raw result:", result)
-        return result.tasks_output[0].raw if hasattr(result, "tasks_output") else "No output"
+        return self._run_feature("budget", selected_place)
 
+    @_cached_crew_output("transport")
     def run_transport_options(self, selected_place):
-        st.write(f"DEBUG — [run_transport_options] for {selected_place}")
-        agents = TripAgents()
-        tasks = Triptasks()
-        agent = agents.transport_agent()
-        task = tasks.transport_options_task(agent, self.inputs, selected_place)
-        crew = Crew(agents=[agent], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        st.write("DEBUG — Raw result:", result)
-        return result.tasks_output[0].raw if hasattr(result, "tasks_output") else "No output"
+        return self._run_feature("transport", selected_place)
 
+    @_cached_crew_output("accommodation")
     def run_accommodation_suggestions(self, selected_place):
-        st.write(f"DEBUG — [run_accommodation_suggestions] for {selected_place}")
-        agents = TripAgents()
-        tasks = Triptasks()
-        agent = agents.stay_advisor_agent()
-        task = tasks.stay_advisor_task(agent, self.inputs, selected_place)
-        crew = Crew(agents=[agent], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        st.write("DEBUG — Raw result:", result)
-        return result.tasks_output[0].raw if hasattr(result, "tasks_output") else "No output"
+        return self._run_feature("accommodation", selected_place)
 
+    @_cached_crew_output("reviews")
     def run_reviews_and_ratings(self, selected_place):
-        st.write(f"DEBUG — [run_reviews_and_ratings] for {selected_place}")
-        agents = TripAgents()
-        tasks = Triptasks()
-        agent = agents.reviews_agent()
-        task = tasks.reviews_task(agent, selected_place)
-        crew = Crew(agents=[agent], tasks=[task], verbose=True)
+        return self._run_feature("reviews", selected_place)
+
+    def _run_feature(self, feature, selected_place):
+        """
+        Runs one per-place feature as a single-agent crew and returns its raw output.
+        """
+        _dbg(f"DEBUG — [{feature}] for {selected_place}")
+        if not _is_place(selected_place) and not (feature in PLACE_OPTIONAL_FEATURES and selected_place is None):
+            _dbg(f"DEBUG — [{feature}] skipped, invalid place:", selected_place)
+            return "No output"
+        agent_name, task_name = PLACE_FEATURES[feature]
+        agent = _crew_agent(agent_name)
+        task = getattr(self.tasks, task_name)(agent, self.inputs, selected_place)
+        crew = Crew(agents=[agent], tasks=[task], verbose=VERBOSE)
         result = crew.kickoff()
-        st.write("DEBUG — Raw result:", result)
-        return result.tasks_output[0].raw if hasattr(result, "tasks_output") else "No output"
+        _dbg("DEBUG — Raw result:", result)
+        return _first_task_raw(result)
+
+    # --- Async entry points for the API: same flows, off the event loop and rate-limited ---
+    async def run_async(self):
+        return await _in_crew_thread(self.run)
+
+    async def run_local_expert_async(self, selected_place):
+        return await _in_crew_thread(self.run_local_expert, selected_place)
+
+    async def run_schedule_trip_async(self, selected_place, selected_attractions, selected_cuisines):
+        return await _in_crew_thread(
+            self.run_schedule_trip, selected_place, selected_attractions, selected_cuisines
+        )
+
+    @classmethod
+    async def run_batch_async(cls, inputs_list):
+        """
+        City suggestions for several independent preference sets at once. Each set gets its
+        own Tripcrew and each run its own city selector copy, so kickoffs can overlap up to
+        CREW_MAX_CONCURRENCY; duplicate sets in the batch share one run. Returns formatted
+        suggestions in input order.
+        """
+        crews = [cls(inputs) for inputs in inputs_list]
+        unique = {crew.inputs_key: crew for crew in crews}
+        results = await asyncio.gather(*(crew.run_async() for crew in unique.values()))
+        by_key = dict(zip(unique, results))
+        return [by_key[crew.inputs_key] for crew in crews]
+
+    async def run_pipeline_async(self, selected_place=None):
+        return await _in_crew_thread(self.run_pipeline, selected_place)
+
+    async def run_schedule_trip_stream(self, selected_place, selected_attractions, selected_cuisines):
+        """
+        Same itinerary as run_schedule_trip, yielded as text chunks while Gemini writes it,
+        so a client can start rendering before the whole JSON has arrived.
+        """
+        if not _is_place(selected_place):
+            yield "No output"
+            return
+        picks = (selected_place, normalize_picks(selected_attractions), normalize_picks(selected_cuisines))
+        # Shares run_schedule_trip's cache entry: a cached itinerary comes back as one chunk,
+        # and a streamed one that validates is stored for both paths
+        caching = LLM_TEMPERATURE <= CREW_CACHE_MAX_TEMPERATURE
+        key = _crew_cache_key("schedule", self.inputs_key, [picks, {}])
+        cached = _cache_get(_CREW_CACHE, key, CREW_CACHE_TTL_SECONDS["schedule"]) if caching else None
+        if caching:
+            with _CACHE_LOCK:
+                _CREW_CACHE_STATS["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            yield cached if isinstance(cached, str) else orjson.dumps(cached).decode()
+            return
+        scheduling_expert = _crew_agent("trip_scheduler_agent")
+        schedule_task = self.tasks.schedule_trip_task(
+            scheduling_expert, selected_place, self.inputs, picks[1], picks[2]
+        )
+        parts = []
+        async for chunk in _stream_crew(scheduling_expert, schedule_task):
+            parts.append(chunk)
+            yield chunk
+        if caching:
+            text = "".join(parts)
+            try:
+                itinerary = Itinerary.model_validate_json(_json_span(text) or text)
+            except ValidationError:
+                return
+            structured = itinerary.model_dump(by_alias=True, exclude_unset=True)
+            if not _is_no_output(structured):
+                _cache_put(_CREW_CACHE, key, structured)
+
+    async def run_feature_stream(self, feature, selected_place=None):
+        """
+        Streaming twin of the per-place feature runs (local_info included): yields the
+        feature's raw output as text chunks while Gemini writes it.
+        """
+        if not _is_place(selected_place) and not (feature in PLACE_OPTIONAL_FEATURES and selected_place is None):
+            yield "No output"
+            return
+        agent_name, task_name = PLACE_FEATURES[feature]
+        agent = _crew_agent(agent_name)
+        task = getattr(self.tasks, task_name)(agent, self.inputs, selected_place)
+        async for chunk in _stream_crew(agent, task):
+            yield chunk
+
+    async def run_feature_async(self, feature, selected_place=None):
+        return await _in_crew_thread(self._feature_runs()[feature], selected_place)
+
+    def _feature_runs(self):
+        return {
+            "safety": self.run_safety_info,
+            "packing": self.run_packing_list,
+            "budget": self.run_budget_breakdown,
+            "transport": self.run_transport_options,
+            "accommodation": self.run_accommodation_suggestions,
+            "reviews": self.run_reviews_and_ratings,
+        }
+
+    async def iter_features(self, selected_place):
+        """
+        Runs the six feature flows for one place concurrently and yields (feature, raw output)
+        as each crew finishes, so a UI can fill in each card without waiting for the slowest.
+        """
+        async def run(feature, fn):
+            return feature, await _in_crew_thread(fn, selected_place)
+
+        for next_done in asyncio.as_completed([run(f, fn) for f, fn in self._feature_runs().items()]):
+            yield await next_done
+
+    async def run_all_features(self, selected_place):
+        """
+        Runs the six feature flows for one place concurrently, one thread per crew.
+        Each flow kicks off on its own agent copy and only returns its raw output.
+        Returns {feature: raw output}.
+        """
+        outputs = {feature: raw async for feature, raw in self.iter_features(selected_place)}
+        return {feature: outputs[feature] for feature in self._feature_runs()}
+
+
+# A Tripcrew only keeps its normalized inputs, budget split and rendered prompt block, all
+# read-only after __init__, and every kickoff builds its own tasks on a _crew_agent() copy.
+# So one instance per distinct preference set is shared across requests and threads.
+_TRIPCREW_CACHE = {}
+
+
+def get_tripcrew(inputs) -> Tripcrew:
+    """Shared Tripcrew for these trip inputs, built on first use and kept for CACHE_TTL_SECONDS."""
+    key = hashlib.blake2b(
+        orjson.dumps(inputs, option=orjson.OPT_SORT_KEYS, default=str), digest_size=16
+    ).hexdigest()
+    planner = _cache_get(_TRIPCREW_CACHE, key)
+    if planner is None:
+        planner = Tripcrew(inputs)
+        _cache_put(_TRIPCREW_CACHE, key, planner)
+    return planner
 
 
 # ----------------------------
 # Formatters / Parsers
 # ----------------------------
+# Fields of a formatted city suggestion, in output order, and their fallbacks
+_CITY_SUGGESTION_DEFAULTS = {
+    "place": "Unknown",
+    "reason": "No reason provided.",
+    "weather_suitability": "—",
+    "travel_cost_estimate": {},
+    "accommodation_range": "—",
+    "safety_rating": "—",
+    "accessibility": "—",
+    "permit_required": "—",
+    "photos": [],
+}
+
+
+def _json_span(text: str):
+    """
+    Returns the first balanced {...} or [...] in text using one linear bracket-depth scan
+    (string literals and escapes respected). If the brackets never balance, falls back to
+    everything up to the last matching closer.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    opener = text[start]
+    closer = "}" if opener == "{" else "]"
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    end = text.rfind(closer)
+    return text[start:end + 1] if end > start else None
+
+
 class format_data:
     def _extract_json_in_backticks(self, text):
         if not isinstance(text, str):
             return None
-        match = re.search(r"```json\s*(\{.*?\}|\[.*?\])\s*```", text, re.DOTALL | re.IGNORECASE)
-        if match:
-            return match.group(1)
+        # Fast path: slice between the ```json fence and the next closing fence
+        start = text.find("```json")
+        if start == -1:
+            start = text.lower().find("```json")
+        if start != -1:
+            end = text.find("```", start + 7)
+            body = text[start + 7:end if end != -1 else len(text)].strip()
+            if body[:1] in ("{", "["):
+                return body
         # Fallback: try to find array/object
-        alt = re.search(r"(\{.*\}|\[.*\])", text, re.DOTALL)
-        return alt.group(1) if alt else None
+        return _json_span(text)
 
     def format_city_suggestions(self, places_data):
         # Try to parse the input into a list of dicts
@@ -861,37 +1753,39 @@ class format_data:
         else:
             raw = self._extract_json_in_backticks(places_data) or places_data
             try:
-                places = json.loads(raw)
+                places = orjson.loads(raw)
             except Exception:
-                st.write("DEBUG — Failed to parse places_data:", raw)
+                _dbg("DEBUG — Failed to parse places_data:", raw)
                 return []
 
-        formatted = []
-        for item in places:
-            formatted.append({
-                "place": item.get("place", "Unknown"),
-                "reason": item.get("reason", "No reason provided."),
-                "weather_suitability": item.get("weather_suitability", "—"),
-                "travel_cost_estimate": item.get("travel_cost_estimate", {}),
-                "accommodation_range": item.get("accommodation_range", "—"),
-                "safety_rating": item.get("safety_rating", "—"),
-                "accessibility": item.get("accessibility", "—"),
-                "permit_required": item.get("permit_required", "—"),
-                "photos": item.get("photos", [])
-            })
-
-        return formatted
+        # Already-formatted lists (e.g. Tripcrew.run output) come back unchanged
+        if all(isinstance(item, dict) and item.keys() >= _CITY_SUGGESTION_DEFAULTS.keys() for item in places):
+            return places
+
+        return [
+            {
+                **_CITY_SUGGESTION_DEFAULTS,
+                # fresh containers so callers can't mutate the shared defaults
+                "travel_cost_estimate": {},
+                "photos": [],
+                **{key: value for key, value in item.items() if key in _CITY_SUGGESTION_DEFAULTS},
+            }
+            for item in places
+        ]
 
     def format_local_expertise(self, local_output):
         raw = self._extract_json_in_backticks(local_output) or local_output
         try:
-            data = json.loads(raw) if isinstance(raw, str) else (raw or {})
+            data = orjson.loads(raw) if isinstance(raw, str) else (raw or {})
         except Exception:
             return {}
+        if not isinstance(data, dict):
+            return {}
+        attractions = data.get("top_attractions")
+        cuisine = data.get("local_cuisine")
         return {
-            "top_attractions": data.get("top_attractions", []) if isinstance(data.get("top_attractions", []),
-                                                                             list) else [],
-            "local_cuisine": data.get("local_cuisine", []) if isinstance(data.get("local_cuisine", []), list) else []
+            "top_attractions": attractions if isinstance(attractions, list) else [],
+            "local_cuisine": cuisine if isinstance(cuisine, list) else []
         }
 
     def format_trip_schedule(self, schedule_json):
@@ -899,49 +1793,53 @@ class format_data:
             return schedule_json
         raw = self._extract_json_in_backticks(schedule_json) or (schedule_json or "")
         try:
-            return json.loads(raw)
+            return orjson.loads(raw)
         except Exception:
             return {"error": "Invalid JSON format received from the model."}
 
     # ---- NEW parsers (optional) ----
-    def format_safety_info(self, raw):
+    def _parse_feature(self, raw, model):
+        """
+        Decodes a feature payload as the model sent it, keys its output model doesn't declare
+        included. The model only checks the shape: a mismatch is traced under DEBUG and the
+        payload is still returned. Non-object JSON and unparseable text become {}.
+        """
+        if isinstance(raw, (dict, list)):
+            return raw
         js = self._extract_json_in_backticks(raw) or raw
+        if not js:
+            return {}
         try:
-            return json.loads(js)
-        except Exception:
+            data = orjson.loads(js)
+        except orjson.JSONDecodeError:
             return {}
+        if not isinstance(data, (dict, list)):
+            return {}
+        if DEBUG and isinstance(data, dict):
+            try:
+                model.model_validate(data)
+            except ValidationError as e:
+                _dbg(f"DEBUG — {model.__name__} payload doesn't fit the schema:", str(e))
+        return data
+
+    def format_safety_info(self, raw):
+        return self._parse_feature(raw, SafetyInfo)
 
     def format_packing_list(self, raw):
-        js = self._extract_json_in_backticks(raw) or raw
-        try:
-            return json.loads(js)
-        except Exception:
-            return {}
+        return self._parse_feature(raw, PackingList)
 
     def format_budget_breakdown(self, raw):
-        js = self._extract_json_in_backticks(raw) or raw
-        try:
-            return json.loads(js)
-        except Exception:
-            return {}
+        return self._parse_feature(raw, BudgetBreakdown)
 
     def format_transport_options(self, raw):
-        js = self._extract_json_in_backticks(raw) or raw
-        try:
-            return json.loads(js)
-        except Exception:
-            return {}
+        return self._parse_feature(raw, TransportOptions)
 
     def format_accommodation_suggestions(self, raw):
-        js = self._extract_json_in_backticks(raw) or raw
-        try:
-            return json.loads(js)
-        except Exception:
-            return {}
+        return self._parse_feature(raw, StaySuggestions)
 
     def format_reviews(self, raw):
-        js = self._extract_json_in_backticks(raw) or raw
-        try:
-            return json.loads(js)
-        except Exception:
-            return {}
\ No newline at end of file
+        return self._parse_feature(raw, ReviewsSummary)
+
+
+# format_data holds no state, so one shared instance serves every caller
+FORMATTER = format_data()
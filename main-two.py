@@ -1,31 +1,80 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
 from typing import Optional, Tuple, List
-from fastapi import FastAPI
-from pydantic import BaseModel
-from agents import Tripcrew, format_data
+import orjson
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from agents import (
+    FORMATTER, Tripcrew, cached_response_body, close_async_http_client, crew_cache_stats,
+    get_tripcrew, normalize_picks, store_response_body,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+
+
+class OrjsonResponse(JSONResponse):
+    """
+    JSON responses rendered by orjson; the LLM payloads are large nested dicts/lists.
+    The LLM endpoints return it directly, which also skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
 
-app = FastAPI(title="Trip Planner API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Photo/weather lookups share one pooled httpx client on the server's event loop
+    await close_async_http_client()
 
-# Allow CORS for React frontend
+
+app = FastAPI(title="Trip Planner API", version="1.0.0",
+              default_response_class=OrjsonResponse, lifespan=lifespan)
+
+# Allow CORS for React frontend. CORS_ALLOW_ORIGINS takes a comma-separated allowlist.
+# Credentials (cookies, auth headers) need an explicit list: with "*" and credentials on,
+# Starlette would echo any site's Origin back, letting every site make credentialed calls.
+CORS_ALLOW_ORIGINS = [o.strip() for o in os.getenv("CORS_ALLOW_ORIGINS", "*").split(",") if o.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ALLOW_ORIGINS,
+    allow_credentials="*" not in CORS_ALLOW_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type", "authorization"],
+    max_age=86400,  # let browsers cache preflights for a day
+)
+
+# Compress the large itinerary/dossier JSON bodies. Added after CORS so it wraps it
+# (preflights stay tiny and uncompressed); SSE and NDJSON streams are left alone so
+# each event still reaches the client as soon as it is produced.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1024,
+    compresslevel=5,
+    exclude_content_types=("text/event-stream", "application/x-ndjson"),
 )
 
 # ---------------------------
 # Pydantic models
 # ---------------------------
 
+# Request bodies are read-only once validated: frozen, unknown fields dropped, text trimmed
+REQUEST_MODEL_CONFIG = ConfigDict(frozen=True, extra="ignore", str_strip_whitespace=True)
+
 class BudgetRange(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     transport: Optional[Tuple[int, int]] = None
     accommodation: Optional[Tuple[int, int]] = None
     food: Optional[Tuple[int, int]] = None
     entertainment: Optional[Tuple[int, int]] = None
 
 class Preferences(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     travel_type: str
     total_budget: Optional[int] = None  # e.g., INR
     budget_range: Optional[BudgetRange] = None
@@ -37,20 +86,59 @@ class Preferences(BaseModel):
     planning_style: Optional[str] = None  # e.g., "holiday_based" / "season_based"
 
 class LocalRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     preferences: Preferences
     selected_place: str
 
+class BatchLocalRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    preferences: Preferences
+    selected_places: List[str]
+
 class ScheduleRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     preferences: Preferences
     selected_place: str
     selected_attractions: List[str]
     selected_cuisines: List[str]
 
+class PipelineRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    preferences: Preferences
+    selected_place: Optional[str] = None  # None: plan the top suggestion
+
 # Optional: separate request for endpoints that only need preferences
 class PreferencesOnly(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     preferences: Preferences
 
 
+def _warm_up_request_models():
+    """
+    Validates a stub body through every request model at import, so the first real request
+    doesn't pay pydantic-core's first-call setup (~0.3 ms per model on a cold process).
+    """
+    prefs = {
+        "travel_type": "leisure", "total_budget": 1, "budget_range": {"food": (0, 1)},
+        "no_of_people": 1, "group_type": "solo", "duration": 1, "interests": "-",
+    }
+    place = {"preferences": prefs, "selected_place": "-"}
+    Preferences.model_validate(prefs)
+    PreferencesOnly.model_validate({"preferences": prefs})
+    LocalRequest.model_validate(place)
+    PipelineRequest.model_validate(place)
+    BatchLocalRequest.model_validate({"preferences": prefs, "selected_places": ["-"]})
+    ScheduleRequest.model_validate({**place, "selected_attractions": ["-"], "selected_cuisines": ["-"]})
+
+
+_warm_up_request_models()
+
+
 # ---------------------------
 # Health/root
 # ---------------------------
@@ -59,35 +147,183 @@ class PreferencesOnly(BaseModel):
 def root():
     return {"message": "Trip Planner API is running"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return crew_cache_stats()
+
+
+async def _cached_json(planner: Tripcrew, feature: str, args, build, live: bool = False) -> Response:
+    """
+    Response for an LLM endpoint whose payload build() assembles from crew output. The encoded
+    body is kept next to the crew cache, so a repeat request returns the stored bytes as-is.
+    live=True marks a payload with live data (current weather) added after the crew run: its
+    body is rebuilt every time, while the crew output inside still comes from the crew cache.
+    """
+    body = None if live else cached_response_body(feature, planner.inputs_key, args)
+    if body is None:
+        payload = await build()
+        body = orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+        if not live:
+            store_response_body(feature, planner.inputs_key, args, payload["raw"], body)
+    return Response(content=body, media_type="application/json")
+
+
+async def _feature_response(planner: Tripcrew, feature: str, place: Optional[str] = None) -> Response:
+    """{"raw", "formatted"} response for one per-place feature (safety, packing, budget, ...)."""
+    async def build():
+        raw = await planner.run_feature_async(feature, place)
+        return {"raw": raw, "formatted": DOSSIER_FORMATTERS[feature](raw)}
+
+    return await _cached_json(planner, feature, [place], build)
+
 
 # ---------------------------
 # Existing endpoints
 # ---------------------------
 
 @app.post("/generate")
-def generate_trip(preferences: Preferences):
-    planner = Tripcrew(preferences.dict())
-    result = planner.run()
-    formatted = format_data().format_city_suggestions(result)
-    return {"raw": result, "places": formatted}
+async def generate_trip(preferences: Preferences, fast: bool = False):
+    # fast=true: one LLM call plus parallel photo lookups instead of the tool-using agent
+    planner = get_tripcrew(preferences.model_dump())
+
+    async def build():
+        result = await (planner.run_fast_async() if fast else planner.run_async())
+        return {"raw": result, "places": FORMATTER.format_city_suggestions(result)}
+
+    return await _cached_json(
+        planner, "city_selection_direct" if fast else "city_selection", [], build,
+        live=planner.should_show_weather(),
+    )
+
+@app.post("/generate-batch")
+async def generate_trips(preferences: List[Preferences]):
+    results = await Tripcrew.run_batch_async([p.model_dump() for p in preferences])
+    return OrjsonResponse([
+        {"raw": result, "places": FORMATTER.format_city_suggestions(result)}
+        for result in results
+    ])
 
 @app.post("/local-info")
-def get_local_info(data: LocalRequest):
-    planner = Tripcrew(data.preferences.dict())
-    raw = planner.run_local_expert(data.selected_place)
-    formatted = format_data().format_local_expertise(raw)
-    return {"raw": raw, "formatted": formatted}
+async def get_local_info(data: LocalRequest):
+    planner = get_tripcrew(data.preferences.model_dump())
+
+    async def build():
+        raw = await planner.run_local_expert_async(data.selected_place)
+        return {"raw": raw, "formatted": FORMATTER.format_local_expertise(raw)}
+
+    return await _cached_json(planner, "local_info", [data.selected_place], build)
+
+@app.post("/local-info-batch")
+async def get_local_info_batch(data: BatchLocalRequest):
+    """Local info for several places at once; the crews run concurrently, one per distinct place."""
+    planner = get_tripcrew(data.preferences.model_dump())
+    places = list(dict.fromkeys(data.selected_places))
+    raws = await asyncio.gather(*(planner.run_local_expert_async(place) for place in places))
+    by_place = dict(zip(places, raws))
+    return OrjsonResponse([
+        {"place": place, "raw": by_place[place], "formatted": FORMATTER.format_local_expertise(by_place[place])}
+        for place in data.selected_places
+    ])
 
 @app.post("/schedule-trip")
-def schedule(data: ScheduleRequest):
-    planner = Tripcrew(data.preferences.dict())
-    raw = planner.run_schedule_trip(
-        data.selected_place,
-        data.selected_attractions,
-        data.selected_cuisines
+async def schedule(data: ScheduleRequest):
+    planner = get_tripcrew(data.preferences.model_dump())
+    # Keyed like the crew cache: the same picks in any order share one stored response
+    args = [data.selected_place, normalize_picks(data.selected_attractions), normalize_picks(data.selected_cuisines)]
+
+    async def build():
+        result = await planner.run_schedule_trip_async(*args)
+        # raw stays the itinerary JSON text it has always been; the validated structure (or
+        # None when the output didn't validate) is added alongside as "itinerary"
+        itinerary = result if isinstance(result, dict) else None
+        raw = result if itinerary is None else orjson.dumps(itinerary).decode()
+        return {"raw": raw, "formatted": FORMATTER.format_trip_schedule(result), "itinerary": itinerary}
+
+    return await _cached_json(planner, "schedule", args, build)
+
+@app.post("/schedule-trip/stream")
+async def schedule_stream(data: ScheduleRequest):
+    """
+    Server-Sent Events version of /schedule-trip: one `data:` event per text chunk
+    (JSON-encoded string), then an `end` event once the itinerary is complete.
+    """
+    planner = get_tripcrew(data.preferences.model_dump())
+
+    async def events():
+        async for chunk in planner.run_schedule_trip_stream(
+            data.selected_place,
+            data.selected_attractions,
+            data.selected_cuisines
+        ):
+            yield b"data: " + orjson.dumps(chunk) + b"\n\n"
+        yield b"event: end\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# Formatter for each section of the /dossier response
+DOSSIER_FORMATTERS = {
+    "local_info": FORMATTER.format_local_expertise,
+    "safety": FORMATTER.format_safety_info,
+    "packing": FORMATTER.format_packing_list,
+    "budget": FORMATTER.format_budget_breakdown,
+    "transport": FORMATTER.format_transport_options,
+    "accommodation": FORMATTER.format_accommodation_suggestions,
+    "reviews": FORMATTER.format_reviews,
+}
+
+@app.post("/dossier")
+async def dossier(data: LocalRequest):
+    """
+    Local info plus every per-place feature for one destination in a single request;
+    the seven crews run concurrently instead of as seven sequential calls.
+    """
+    planner = get_tripcrew(data.preferences.model_dump())
+    local_info, features = await asyncio.gather(
+        planner.run_local_expert_async(data.selected_place),
+        planner.run_all_features(data.selected_place),
     )
-    formatted = format_data().format_trip_schedule(raw)
-    return {"raw": raw, "formatted": formatted}
+    raws = {"local_info": local_info, **features}
+    return OrjsonResponse({
+        section: {"raw": raw, "formatted": DOSSIER_FORMATTERS[section](raw)}
+        for section, raw in raws.items()
+    })
+
+async def _ndjson(chunks, formatter):
+    """NDJSON frames: {"chunk": text} per streamed piece, then {"raw", "formatted"} once done."""
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield orjson.dumps({"chunk": chunk}) + b"\n"
+    raw = "".join(parts)
+    yield orjson.dumps({"raw": raw, "formatted": formatter(raw)}) + b"\n"
+
+@app.post("/stream/{section}")
+async def stream_section(section: str, data: LocalRequest):
+    """Streams one /dossier section (local_info, safety, packing, ...) as NDJSON."""
+    if section not in DOSSIER_FORMATTERS:
+        raise HTTPException(status_code=404, detail=f"Unknown section: {section}")
+    planner = get_tripcrew(data.preferences.model_dump())
+    chunks = planner.run_feature_stream(section, data.selected_place)
+    return StreamingResponse(_ndjson(chunks, DOSSIER_FORMATTERS[section]), media_type="application/x-ndjson")
+
+@app.post("/pipeline")
+async def pipeline(data: PipelineRequest):
+    """
+    Destination suggestions, local info and itinerary in a single crew run,
+    for clients that don't need to pick attractions/cuisines in between.
+    """
+    planner = get_tripcrew(data.preferences.model_dump())
+
+    async def build():
+        raw = await planner.run_pipeline_async(data.selected_place)
+        return {
+            "raw": raw,
+            "places": FORMATTER.format_city_suggestions(raw["places"]),
+            "local_info": FORMATTER.format_local_expertise(raw["local_info"]),
+            "schedule": FORMATTER.format_trip_schedule(raw["schedule"]),
+        }
+
+    return await _cached_json(planner, "pipeline", [data.selected_place], build)
 
 
 # ---------------------------
@@ -95,15 +331,13 @@ def schedule(data: ScheduleRequest):
 # ---------------------------
 
 @app.post("/safety-info")
-def safety_info(data: LocalRequest):
+async def safety_info(data: LocalRequest):
     """
     Returns destination-specific safety advisories, local norms, scams to avoid,
     emergency numbers, hospital list, and neighborhood safety tips.
     """
-    planner = Tripcrew(data.preferences.dict())
-    raw = planner.run_safety_info(data.selected_place)
-    formatted = format_data().format_safety_info(raw)
-    return {"raw": raw, "formatted": formatted}
+    planner = get_tripcrew(data.preferences.model_dump())
+    return await _feature_response(planner, "safety", data.selected_place)
 
 
 # ---------------------------
@@ -111,15 +345,13 @@ def safety_info(data: LocalRequest):
 # ---------------------------
 
 @app.post("/packing-list")
-def packing_list(data: LocalRequest):
+async def packing_list(data: LocalRequest):
     """
     Returns a smart packing list based on destination, season, activities,
     group type (family, friends), duration, and weather (if near-term).
     """
-    planner = Tripcrew(data.preferences.dict())
-    raw = planner.run_packing_list(data.selected_place)
-    formatted = format_data().format_packing_list(raw)
-    return {"raw": raw, "formatted": formatted}
+    planner = get_tripcrew(data.preferences.model_dump())
+    return await _feature_response(planner, "packing", data.selected_place)
 
 
 # ---------------------------
@@ -127,15 +359,13 @@ def packing_list(data: LocalRequest):
 # ---------------------------
 
 @app.post("/budget-breakdown")
-def budget_breakdown(payload: PreferencesOnly):
+async def budget_breakdown(payload: PreferencesOnly):
     """
     Returns a normalized budget breakdown into transport/accommodation/food/entertainment,
     fills gaps from total_budget if category ranges are missing, and suggests daily caps.
     """
-    planner = Tripcrew(payload.preferences.dict())
-    raw = planner.run_budget_breakdown()
-    formatted = format_data().format_budget_breakdown(raw)
-    return {"raw": raw, "formatted": formatted}
+    planner = get_tripcrew(payload.preferences.model_dump())
+    return await _feature_response(planner, "budget")
 
 
 # ---------------------------
@@ -143,15 +373,13 @@ def budget_breakdown(payload: PreferencesOnly):
 # ---------------------------
 
 @app.post("/transport-options")
-def transport_options(data: LocalRequest):
+async def transport_options(data: LocalRequest):
     """
     Returns in-city transport choices, inter-attraction routes,
     estimated times/costs, and tips (e.g., metro vs cab vs rickshaw).
     """
-    planner = Tripcrew(data.preferences.dict())
-    raw = planner.run_transport_options(data.selected_place)
-    formatted = format_data().format_transport_options(raw)
-    return {"raw": raw, "formatted": formatted}
+    planner = get_tripcrew(data.preferences.model_dump())
+    return await _feature_response(planner, "transport", data.selected_place)
 
 
 # ---------------------------
@@ -159,15 +387,13 @@ def transport_options(data: LocalRequest):
 # ---------------------------
 
 @app.post("/accommodation-suggestions")
-def accommodation_suggestions(data: LocalRequest):
+async def accommodation_suggestions(data: LocalRequest):
     """
     Returns stay suggestions by neighborhood and price band,
     with types (hotel, homestay), pros/cons, and sample properties.
     """
-    planner = Tripcrew(data.preferences.dict())
-    raw = planner.run_accommodation_suggestions(data.selected_place)
-    formatted = format_data().format_accommodation_suggestions(raw)
-    return {"raw": raw, "formatted": formatted}
+    planner = get_tripcrew(data.preferences.model_dump())
+    return await _feature_response(planner, "accommodation", data.selected_place)
 
 
 # ---------------------------
@@ -175,12 +401,27 @@ def accommodation_suggestions(data: LocalRequest):
 # ---------------------------
 
 @app.post("/reviews")
-def reviews(data: LocalRequest):
+async def reviews(data: LocalRequest):
     """
     Returns curated reviews & ratings summaries for attractions,
     restaurants, and experiences relevant to the user's interests.
     """
-    planner = Tripcrew(data.preferences.dict())
-    raw = planner.run_reviews_and_ratings(data.selected_place)
-    formatted = format_data().format_reviews(raw)
-    return {"raw": raw, "formatted": formatted}
\ No newline at end of file
+    planner = get_tripcrew(data.preferences.model_dump())
+    return await _feature_response(planner, "reviews", data.selected_place)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # loop/http "auto" pick uvloop and httptools when installed (uvicorn[standard]).
+    # Caches are per process, so extra workers trade crew-cache hits for parallelism.
+    uvicorn.run(
+        "main-two:app",
+        host=os.getenv("API_HOST", "127.0.0.1"),
+        port=int(os.getenv("API_PORT", "8000")),
+        loop="auto",
+        http="auto",
+        workers=int(os.getenv("API_WORKERS", "1")),
+        backlog=2048,
+        access_log=os.getenv("API_ACCESS_LOG", "1") == "1",
+    )
@@ -1,20 +1,24 @@
 import os
-import re
 import json
+import time
+import asyncio
+import orjson
 import streamlit as st
 from dotenv import load_dotenv
 
 # Import your existing agents and formatters
-from agents import Tripcrew, format_data
+from agents import FORMATTER, get_tripcrew, submit_crew
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-
 # ---------------------------
 # Helpers
 # ---------------------------
 
+_JSON_DECODER = json.JSONDecoder()
+
+
 def _parse_json_blocks(text):
     """
     Try to extract the first JSON array or object from a block of text
@@ -25,27 +29,62 @@ def _parse_json_blocks(text):
     if not isinstance(text, str):
         return None
 
+    # Pure JSON (the usual model output) parses directly
+    if text.lstrip()[:1] in ("{", "["):
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+
     # Try fenced code block with ```json
-    m = re.search(r"```json\s*(\{.*?\}|\[.*?\])\s*```", text, flags=re.DOTALL)
-    if m:
-        candidate = m.group(1)
+    start = text.find("```json")
+    if start != -1:
+        end = text.find("```", start + 7)
         try:
-            return json.loads(candidate)
-        except json.JSONDecodeError:
+            return orjson.loads(text[start + 7:end if end != -1 else len(text)])
+        except orjson.JSONDecodeError:
             pass
 
-    # Try any JSON-looking array/object in the string
-    m2 = re.search(r"(\{.*\}|\[.*\])", text, flags=re.DOTALL)
-    if m2:
-        candidate = m2.group(1)
+    # Decode the first array/object in place: one linear raw_decode from the first "{"
+    # and, failing that, from the first "[" (orjson has no partial decode, so stdlib here)
+    for start in sorted(i for i in (text.find("{"), text.find("[")) if i != -1):
         try:
-            return json.loads(candidate)
-        except json.JSONDecodeError:
+            return _JSON_DECODER.raw_decode(text, start)[0]
+        except (json.JSONDecodeError, RecursionError):
             pass
 
     return None
 
 
+def _stream_to(placeholder, chunks, interval=0.05):
+    """
+    Drains an async stream of text chunks into placeholder (as JSON code), redrawing at most
+    once per interval seconds rather than per chunk; returns the full text.
+    """
+    async def drain():
+        parts, last = [], 0.0
+        async for chunk in chunks:
+            parts.append(chunk)
+            if time.monotonic() - last >= interval:
+                placeholder.code("".join(parts), language="json")
+                last = time.monotonic()
+        return "".join(parts)
+
+    return asyncio.run(drain())
+
+
+def _write_fields(*lines):
+    """Writes several "**Label**: value" lines as one markdown element instead of one each."""
+    if lines:
+        st.markdown("\n\n".join(lines))
+
+
+def _write_bullets(items):
+    """Writes items as one markdown bullet list (a single element)."""
+    if items:
+        st.markdown("\n".join(f"- {item}" for item in items))
+
+
 def _safe_run_reviews(planner, place):
     """Support either run_reviews or run_reviews_and_ratings depending on agents.py implementation."""
     if hasattr(planner, "run_reviews"):
@@ -56,6 +95,71 @@ def _safe_run_reviews(planner, place):
         raise AttributeError("Neither run_reviews nor run_reviews_and_ratings found in Tripcrew.")
 
 
+# Per-place feature flows shown in steps 5-10, in wizard order: feature -> run(planner, place)
+_FEATURE_RUNS = {
+    "safety": lambda planner, place: planner.run_safety_info(place),
+    "packing": lambda planner, place: planner.run_packing_list(place),
+    "budget": lambda planner, place: planner.run_budget_breakdown(),
+    "transport": lambda planner, place: planner.run_transport_options(place),
+    "accommodation": lambda planner, place: planner.run_accommodation_suggestions(place),
+    "reviews": _safe_run_reviews,
+}
+
+
+def _prefetch_local_info(prefs, suggestions):
+    """
+    Start the local-expert crew for every suggested place; returns {place: future}.
+    Background crews go through submit_crew, so every session shares the CREW_MAX_CONCURRENCY cap.
+    """
+    planner = get_tripcrew(prefs)
+    return {
+        item["place"]: submit_crew(planner.run_local_expert, item["place"])
+        for item in suggestions
+        if item.get("place")
+    }
+
+
+def _await(future, message):
+    """Waits for a background crew under a spinner (shown only if the wait exceeds half a second)."""
+    with st.spinner(message, show_time=True):
+        return future.result()
+
+
+def _local_info_for(place):
+    """Prefetched local-expert output for a place, or a fresh background run if it wasn't prefetched."""
+    future = st.session_state.local_futures.get(place)
+    if future is None:
+        future = submit_crew(get_tripcrew(st.session_state.preferences).run_local_expert, place)
+    return _await(future, f"Gathering local insights for {place}…")
+
+
+def _drop_local_prefetches(keep):
+    """
+    Cancels the local-expert runs still queued for the places the user didn't pick, so the
+    feature crews for the chosen place don't wait behind them. Started runs finish and stay.
+    """
+    futures = st.session_state.local_futures
+    for place, future in futures.items():
+        if place != keep:
+            future.cancel()
+    st.session_state.local_futures = {place: f for place, f in futures.items() if not f.cancelled()}
+
+
+def _prefetch_features(prefs, place):
+    """Start every feature crew for the chosen place; returns {feature: future}."""
+    planner = get_tripcrew(prefs)
+    return {feature: submit_crew(run, planner, place) for feature, run in _FEATURE_RUNS.items()}
+
+
+def _feature_for(feature):
+    """Prefetched output of a feature for the selected place, or a fresh background run if it wasn't prefetched."""
+    future = st.session_state.feature_futures.get(feature)
+    if future is None:
+        planner = get_tripcrew(st.session_state.preferences)
+        future = submit_crew(_FEATURE_RUNS[feature], planner, st.session_state.selected_place)
+    return _await(future, f"Preparing {feature} details…")
+
+
 def _init_state():
     defaults = dict(
         step=0,
@@ -64,6 +168,8 @@ def _init_state():
         suggestions_raw=None,
         selected_place=None,
         local_info=None,
+        local_futures={},
+        feature_futures={},
         selected_attractions=[],
         selected_cuisines=[],
         itinerary=None,
@@ -73,31 +179,32 @@ def _init_state():
         transport=None,
         accommodation=None,
         reviews=None,
-        final_export=None,
     )
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
 
 
+_WIZARD_STEPS = (
+    "1) Preferences → Suggestions",
+    "2) Pick Destination",
+    "3) Local Insights (Attractions & Cuisine)",
+    "4) Build Itinerary",
+    "5) Safety",
+    "6) Packing List",
+    "7) Budget",
+    "8) Transport Options",
+    "9) Accommodation",
+    "10) Reviews",
+    "11) Final Plan",
+)
+
+
 def _step_header():
-    steps = [
-        "1) Preferences → Suggestions",
-        "2) Pick Destination",
-        "3) Local Insights (Attractions & Cuisine)",
-        "4) Build Itinerary",
-        "5) Safety",
-        "6) Packing List",
-        "7) Budget",
-        "8) Transport Options",
-        "9) Accommodation",
-        "10) Reviews",
-        "11) Final Plan"
-    ]
+    step = st.session_state.step
+    markers = ("✅ ",) * step + ("➡️ ",) + ("• ",) * (len(_WIZARD_STEPS) - step - 1)
     st.sidebar.title("Trip Planner Wizard")
-    for idx, label in enumerate(steps):
-        marker = "✅ " if idx < st.session_state.step else ("➡️ " if idx == st.session_state.step else "• ")
-        st.sidebar.write(f"{marker}{label}")
+    st.sidebar.markdown("\n\n".join(marker + label for marker, label in zip(markers, _WIZARD_STEPS)))
     st.sidebar.markdown("---")
     if st.session_state.step > 0:
         if st.sidebar.button("⬅️ Back"):
@@ -163,11 +270,11 @@ def step0_preferences():
         }
         st.session_state.preferences = prefs
 
-        planner = Tripcrew(prefs)
+        planner = get_tripcrew(prefs)
         output = planner.run()  # destination suggestions + (now) comparison info
         st.session_state.suggestions_raw = output
 
-        formatter = format_data()
+        formatter = FORMATTER
         # format_city_suggestions should gracefully handle richer objects (keep 'reason', include extra keys if present)
         suggestions = formatter.format_city_suggestions(output) or []
 
@@ -197,6 +304,7 @@ def step0_preferences():
             enriched.append(combined)
 
         st.session_state.suggestions = enriched
+        st.session_state.local_futures = _prefetch_local_info(prefs, enriched)
         st.session_state.step = 1
         st.rerun()
 
@@ -208,6 +316,9 @@ def step0_preferences():
         )
 
 
+# The pick/selection steps are fragments: toggling a radio or checkbox reruns only that step,
+# not the whole script. Moving to another step still calls st.rerun(), which reruns the app.
+@st.fragment
 def step1_pick_destination():
     st.title("Step 2 — Pick your destination")
 
@@ -215,9 +326,8 @@ def step1_pick_destination():
         st.warning("No suggestions available yet. Please go back and generate suggestions.")
         return
 
-    # Show suggestions as selectable cards
-    chosen = None
-    for idx, item in enumerate(st.session_state.suggestions):
+    # Show suggestions as read-only cards; the pick is one selectbox below them
+    for item in st.session_state.suggestions:
         with st.expander(f"🏙️ {item.get('place', 'Unknown Place')}"):
             st.write(f"**Why**: {item.get('reason', '—')}")
 
@@ -254,43 +364,49 @@ def step1_pick_destination():
             else:
                 st.write("No photos available.")
 
-            # Select radio per expander
-            if st.radio("Select this destination?", ("No", "Yes"), key=f"pick_{idx}", index=0) == "Yes":
-                chosen = item.get("place")
-                st.session_state.selected_place = chosen
-
     st.markdown("---")
-    # This button is now outside the loop and will run the next step based on the selected_place state
+    places = [item["place"] for item in st.session_state.suggestions if item.get("place")]
+    current = st.session_state.selected_place
+    st.session_state.selected_place = st.selectbox(
+        "Select destination",
+        places,
+        index=places.index(current) if current in places else None,
+        placeholder="Choose one of the suggestions",
+    )
     if st.button("Continue ➡️", disabled=not st.session_state.selected_place):
-        planner = Tripcrew(st.session_state.preferences)
-        local_info_json = planner.run_local_expert(st.session_state.selected_place)
-        st.session_state.local_info = format_data().format_local_expertise(local_info_json)
+        _drop_local_prefetches(st.session_state.selected_place)
+        # Safety ... reviews only depend on the place: run them while the user builds the itinerary
+        st.session_state.feature_futures = _prefetch_features(
+            st.session_state.preferences, st.session_state.selected_place
+        )
+        local_info_json = _local_info_for(st.session_state.selected_place)
+        st.session_state.local_info = FORMATTER.format_local_expertise(local_info_json)
         st.session_state.step = 2
         st.rerun()
 
 
+@st.fragment
 def step2_local_insights():
     st.title(f"Step 3 — Local insights for {st.session_state.selected_place}")
 
     data = st.session_state.local_info or {}
-    selected_attractions = st.session_state.get("selected_attractions", [])
-    selected_cuisines = st.session_state.get("selected_cuisines", [])
 
     st.subheader("Top Attractions")
     if data.get("top_attractions"):
         for attr in data.get("top_attractions", []):
             with st.expander(f"🏞️ {attr.get('name', 'Attraction')} ({attr.get('category', '—')})"):
-                st.write(f"**Description**: {attr.get('description', '—')}")
-                st.write(f"**Why Visit**: {attr.get('why_visit', '—')}")
-                st.write(f"**Best Time of Day**: {attr.get('best_time_of_day', '—')}")
-                key = f"attr_{attr.get('name', '')}"
-                if st.checkbox(f"Add '{attr.get('name', '')}' to my itinerary", key=key,
-                               value=(attr.get('name') in selected_attractions)):
-                    if attr.get('name') not in selected_attractions:
-                        selected_attractions.append(attr.get('name'))
-                else:
-                    if attr.get('name') in selected_attractions:
-                        selected_attractions.remove(attr.get('name'))
+                _write_fields(
+                    f"**Description**: {attr.get('description', '—')}",
+                    f"**Why Visit**: {attr.get('why_visit', '—')}",
+                    f"**Best Time of Day**: {attr.get('best_time_of_day', '—')}",
+                )
+        attr_names = [a["name"] for a in data.get("top_attractions", []) if a.get("name")]
+        st.session_state.selected_attractions = st.multiselect(
+            "Attractions to include in my itinerary",
+            attr_names,
+            default=[name for name in st.session_state.selected_attractions if name in attr_names],
+            key="attraction_picks",
+        )
     else:
         st.warning("No attraction data available.")
 
@@ -301,41 +417,103 @@ def step2_local_insights():
                 st.write(f"**Description**: {dish.get('description', '—')}")
                 if dish.get("recommended_places"):
                     st.write("**Recommended places:**")
-                    for place in dish.get("recommended_places", []):
-                        st.write(f"- {place}")
-                key = f"cuisine_{dish.get('dish', '')}"
-                if st.checkbox(f"Add '{dish.get('dish', '')}' to my food list", key=key,
-                               value=(dish.get('dish') in selected_cuisines)):
-                    if dish.get('dish') not in selected_cuisines:
-                        selected_cuisines.append(dish.get('dish'))
-                else:
-                    if dish.get('dish') in selected_cuisines:
-                        selected_cuisines.remove(dish.get('dish'))
+                    _write_bullets(dish.get("recommended_places", []))
+        dish_names = [d["dish"] for d in data.get("local_cuisine", []) if d.get("dish")]
+        st.session_state.selected_cuisines = st.multiselect(
+            "Dishes to add to my food list",
+            dish_names,
+            default=[name for name in st.session_state.selected_cuisines if name in dish_names],
+            key="cuisine_picks",
+        )
     else:
         st.warning("No cuisine data available.")
 
-    st.session_state.selected_attractions = selected_attractions
-    st.session_state.selected_cuisines = selected_cuisines
-
     st.markdown("---")
     col1, col2 = st.columns(2)
     if col1.button("⬅️ Back to Destinations"):
         st.session_state.step = 1
         st.rerun()
 
-    can_continue = bool(selected_attractions or selected_cuisines)
+    can_continue = bool(st.session_state.selected_attractions or st.session_state.selected_cuisines)
     if col2.button("Continue to Itinerary ➡️", disabled=not can_continue):
-        planner = Tripcrew(st.session_state.preferences)
-        schedule_json = planner.run_schedule_trip(
-            st.session_state.selected_place,
-            st.session_state.selected_attractions,
-            st.session_state.selected_cuisines
-        )
-        st.session_state.itinerary = format_data().format_trip_schedule(schedule_json)
+        planner = get_tripcrew(st.session_state.preferences)
+        # Show the itinerary while Gemini writes it instead of blocking on the whole crew run
+        with st.status("Writing your itinerary…", expanded=True):
+            schedule_json = _stream_to(st.empty(), planner.run_schedule_trip_stream(
+                st.session_state.selected_place,
+                st.session_state.selected_attractions,
+                st.session_state.selected_cuisines
+            ))
+        st.session_state.itinerary = FORMATTER.format_trip_schedule(schedule_json)
         st.session_state.step = 3
         st.rerun()
 
 
+def _render_spot(step):
+    st.subheader(f"📍 Visit: {step.get('name', 'Attraction')}")
+    lines = [
+        f"**Category**: {step.get('category', '—')}",
+        f"**Time**: {step.get('visit_time', '—')}",
+    ]
+    if step.get("must_visit_time"):
+        lines.append(f"**Must Visit**: {step.get('must_visit_time', '—')}")
+    lines.append(f"**Reason**: {step.get('reason', '—')}")
+    _write_fields(*lines)
+
+
+def _render_restaurant(step):
+    st.subheader(f"🍽️ Lunch/Dinner: {step.get('name', 'Restaurant')}")
+    _write_fields(
+        f"**Location**: {step.get('location', '—')}",
+        f"**Rating**: {step.get('rating', '—')}",
+        f"**Cuisines**: {', '.join(step.get('cuisines_served', []))}",
+    )
+
+
+def _render_accommodation(step):
+    st.subheader("🏨 Stay Options")
+    _write_bullets([
+        f"**{option.get('name')}**\n"
+        f"  - **Location**: {option.get('location', '—')}\n"
+        f"  - **Price Range**: {option.get('price_range', '—')}"
+        for option in step.get("options", [])
+    ])
+
+
+def _render_travel(step):
+    st.subheader(f"🚗 Travel: {step.get('from', '—')} → {step.get('to', '—')}")
+    _write_bullets([
+        f"**Mode**: {option.get('mode', '—')}\n"
+        f"  - **Time**: {option.get('time', '—')}\n"
+        f"  - **Cost**: {option.get('cost', '—')}"
+        for option in step.get("options", [])
+    ])
+
+
+def _render_cuisine(step):
+    st.subheader(f"🥘 Try Local Dish: {step.get('dish', 'Dish')}")
+    _write_fields(
+        f"**Origin**: {step.get('origin', '—')}",
+        f"**Time to Consume**: {step.get('time_to_consume', '—')}",
+    )
+
+
+def _render_break(step):
+    st.subheader(f"☕️ Break: {step.get('activity', 'Break')}")
+    st.write(f"**Duration**: {step.get('duration', '—')}")
+
+
+# Itinerary step type -> renderer; unknown types are skipped
+_ITINERARY_RENDERERS = {
+    "spot": _render_spot,
+    "restaurant": _render_restaurant,
+    "accommodation": _render_accommodation,
+    "travel": _render_travel,
+    "cuisine": _render_cuisine,
+    "break": _render_break,
+}
+
+
 def step3_itinerary():
     st.title(f"Step 4 — Your day-by-day itinerary for {st.session_state.selected_place}")
 
@@ -348,44 +526,9 @@ def step3_itinerary():
             st.markdown("---")
 
             for step in day_plan.get("steps", []):
-                step_type = step.get("type")
-
-                if step_type == "spot":
-                    st.subheader(f"📍 Visit: {step.get('name', 'Attraction')}")
-                    st.write(f"**Category**: {step.get('category', '—')}")
-                    st.write(f"**Time**: {step.get('visit_time', '—')}")
-                    if step.get("must_visit_time"):
-                        st.write(f"**Must Visit**: {step.get('must_visit_time', '—')}")
-                    st.write(f"**Reason**: {step.get('reason', '—')}")
-
-                elif step_type == "restaurant":
-                    st.subheader(f"🍽️ Lunch/Dinner: {step.get('name', 'Restaurant')}")
-                    st.write(f"**Location**: {step.get('location', '—')}")
-                    st.write(f"**Rating**: {step.get('rating', '—')}")
-                    st.write(f"**Cuisines**: {', '.join(step.get('cuisines_served', []))}")
-
-                elif step_type == "accommodation":
-                    st.subheader("🏨 Stay Options")
-                    for option in step.get("options", []):
-                        st.write(f"**- {option.get('name')}**")
-                        st.write(f"  - **Location**: {option.get('location', '—')}")
-                        st.write(f"  - **Price Range**: {option.get('price_range', '—')}")
-
-                elif step_type == "travel":
-                    st.subheader(f"🚗 Travel: {step.get('from', '—')} → {step.get('to', '—')}")
-                    for option in step.get("options", []):
-                        st.write(f"- **Mode**: {option.get('mode', '—')}")
-                        st.write(f"  - **Time**: {option.get('time', '—')}")
-                        st.write(f"  - **Cost**: {option.get('cost', '—')}")
-
-                elif step_type == "cuisine":
-                    st.subheader(f"🥘 Try Local Dish: {step.get('dish', 'Dish')}")
-                    st.write(f"**Origin**: {step.get('origin', '—')}")
-                    st.write(f"**Time to Consume**: {step.get('time_to_consume', '—')}")
-
-                elif step_type == "break":
-                    st.subheader(f"☕️ Break: {step.get('activity', 'Break')}")
-                    st.write(f"**Duration**: {step.get('duration', '—')}")
+                renderer = _ITINERARY_RENDERERS.get(step.get("type"))
+                if renderer:
+                    renderer(step)
     else:
         st.warning("No itinerary data available. Please re-run the previous steps.")
 
@@ -397,8 +540,8 @@ def step3_itinerary():
 
     if col2.button("Continue ➡️"):
         # Preload safety for next step
-        raw = Tripcrew(st.session_state.preferences).run_safety_info(st.session_state.selected_place)
-        st.session_state.safety = format_data().format_safety_info(raw)
+        raw = _feature_for("safety")
+        st.session_state.safety = FORMATTER.format_safety_info(raw)
         st.session_state.step = 4
         st.rerun()
 
@@ -411,27 +554,25 @@ def step4_safety():
         st.subheader(f"Overall Risk Level: {safety_data.get('overall_risk_level', '—')}")
 
         with st.expander("Common Scams"):
-            for scam in safety_data.get("common_scams", []):
-                st.write(f"- {scam}")
+            _write_bullets(safety_data.get("common_scams", []))
 
         with st.expander("Local Laws & Norms"):
-            for law in safety_data.get("local_laws_and_norms", []):
-                st.write(f"- {law}")
+            _write_bullets(safety_data.get("local_laws_and_norms", []))
 
         with st.expander("Health Notes"):
             health = safety_data.get("health", {})
-            st.write(f"**Food & Water Safety**: {health.get('food_water_safety', '—')}")
-            st.write(f"**Mosquito Advice**: {health.get('mosquito_advice', '—')}")
-            st.write(f"**Altitude Note**: {health.get('altitude_note', '—')}")
+            _write_fields(
+                f"**Food & Water Safety**: {health.get('food_water_safety', '—')}",
+                f"**Mosquito Advice**: {health.get('mosquito_advice', '—')}",
+                f"**Altitude Note**: {health.get('altitude_note', '—')}",
+            )
 
         with st.expander("Emergency Contacts"):
             contacts = safety_data.get("emergency_contacts", {})
-            for name, number in contacts.items():
-                st.write(f"**{name.replace('_', ' ').title()}**: {number}")
+            _write_fields(*(f"**{name.replace('_', ' ').title()}**: {number}" for name, number in contacts.items()))
 
         with st.expander("Solo Travel Tips"):
-            for tip in safety_data.get("solo_travel_tips", []):
-                st.write(f"- {tip}")
+            _write_bullets(safety_data.get("solo_travel_tips", []))
     else:
         st.warning("No safety data available.")
 
@@ -442,8 +583,8 @@ def step4_safety():
         st.rerun()
     if col2.button("Continue ➡️"):
         # Preload packing
-        raw = Tripcrew(st.session_state.preferences).run_packing_list(st.session_state.selected_place)
-        st.session_state.packing = format_data().format_packing_list(raw)
+        raw = _feature_for("packing")
+        st.session_state.packing = FORMATTER.format_packing_list(raw)
         st.session_state.step = 5
         st.rerun()
 
@@ -469,10 +610,12 @@ def step5_packing():
 
         for title, key in sections:
             with st.expander(f"📦 {title}"):
-                for item in packing_data.get(key, []):
-                    st.write(f"- **{item.get('item', '—')}**")
-                    st.write(f"  - **Why**: {item.get('why', '—')}")
-                    st.write(f"  - **Qty**: {item.get('qty', '—')}")
+                _write_bullets([
+                    f"**{item.get('item', '—')}**\n"
+                    f"  - **Why**: {item.get('why', '—')}\n"
+                    f"  - **Qty**: {item.get('qty', '—')}"
+                    for item in packing_data.get(key, [])
+                ])
     else:
         st.warning("No packing data available.")
 
@@ -483,8 +626,8 @@ def step5_packing():
         st.rerun()
     if col2.button("Continue ➡️"):
         # Preload budget
-        raw = Tripcrew(st.session_state.preferences).run_budget_breakdown()
-        st.session_state.budget = format_data().format_budget_breakdown(raw)
+        raw = _feature_for("budget")
+        st.session_state.budget = FORMATTER.format_budget_breakdown(raw)
         st.session_state.step = 6
         st.rerun()
 
@@ -496,18 +639,18 @@ def step6_budget():
     if budget_data:
         st.subheader("Per Category Budget Range")
         budget_range = budget_data.get("budget_range", {})
-        for category, values in budget_range.items():
-            if values:
-                st.write(f"**{category.title()}**: ₹{values[0]}–₹{values[1]}")
+        _write_fields(*(
+            f"**{category.title()}**: ₹{values[0]}–₹{values[1]}"
+            for category, values in budget_range.items()
+            if values
+        ))
 
         st.subheader("Per Day Estimate (Per Person)")
         per_day = budget_data.get("per_day_estimate_per_person", {})
-        for category, value in per_day.items():
-            st.write(f"**{category.title()}**: {value}")
+        _write_fields(*(f"**{category.title()}**: {value}" for category, value in per_day.items()))
 
         with st.expander("Notes"):
-            for note in budget_data.get("notes", []):
-                st.write(f"- {note}")
+            _write_bullets(budget_data.get("notes", []))
     else:
         st.warning("No budget data available.")
 
@@ -518,8 +661,8 @@ def step6_budget():
         st.rerun()
     if col2.button("Continue ➡️"):
         # Preload transport
-        raw = Tripcrew(st.session_state.preferences).run_transport_options(st.session_state.selected_place)
-        st.session_state.transport = format_data().format_transport_options(raw)
+        raw = _feature_for("transport")
+        st.session_state.transport = FORMATTER.format_transport_options(raw)
         st.session_state.step = 7
         st.rerun()
 
@@ -532,17 +675,21 @@ def step7_transport():
         st.subheader("Intercity Transport Options")
         for option in transport_data.get("intercity", []):
             with st.expander(f"✈️ {option.get('mode', '—')} ({option.get('from', '—')} → {option.get('to', '—')})"):
-                st.write(f"**Time**: {option.get('time', '—')}")
-                st.write(f"**Approx. Cost**: {option.get('approx_cost', '—')}")
-                st.write(f"**Pro Tip**: {option.get('pro_tip', '—')}")
+                _write_fields(
+                    f"**Time**: {option.get('time', '—')}",
+                    f"**Approx. Cost**: {option.get('approx_cost', '—')}",
+                    f"**Pro Tip**: {option.get('pro_tip', '—')}",
+                )
 
         st.subheader("In-City Transport Options")
         for option in transport_data.get("in_city", []):
             with st.expander(f"🚆 {option.get('mode', '—')}"):
-                st.write(f"**When to Use**: {option.get('when_to_use', '—')}")
-                st.write(f"**Approx. Cost**: {option.get('approx_cost', '—')}")
-                st.write(f"**Coverage**: {option.get('coverage', '—')}")
-                st.write(f"**Pro Tip**: {option.get('pro_tip', '—')}")
+                _write_fields(
+                    f"**When to Use**: {option.get('when_to_use', '—')}",
+                    f"**Approx. Cost**: {option.get('approx_cost', '—')}",
+                    f"**Coverage**: {option.get('coverage', '—')}",
+                    f"**Pro Tip**: {option.get('pro_tip', '—')}",
+                )
     else:
         st.warning("No transport data available.")
 
@@ -553,8 +700,8 @@ def step7_transport():
         st.rerun()
     if col2.button("Continue ➡️"):
         # Preload accommodation
-        raw = Tripcrew(st.session_state.preferences).run_accommodation_suggestions(st.session_state.selected_place)
-        st.session_state.accommodation = format_data().format_accommodation_suggestions(raw)
+        raw = _feature_for("accommodation")
+        st.session_state.accommodation = FORMATTER.format_accommodation_suggestions(raw)
         st.session_state.step = 8
         st.rerun()
 
@@ -567,17 +714,21 @@ def step8_accommodation():
         st.subheader("Suggested Neighborhoods")
         for hood in accommodation_data.get("neighborhoods", []):
             with st.expander(f"🏡 {hood.get('name', '—')}"):
-                st.write(f"**Good for**: {', '.join(hood.get('good_for', []))}")
-                st.write(f"**Avoid if**: {', '.join(hood.get('avoid_if', []))}")
+                _write_fields(
+                    f"**Good for**: {', '.join(hood.get('good_for', []))}",
+                    f"**Avoid if**: {', '.join(hood.get('avoid_if', []))}",
+                )
 
         st.subheader("Accommodation Options by Vibe")
         for stay in accommodation_data.get("stays", []):
             with st.expander(f"🛌 {stay.get('name', '—')} ({stay.get('type', '—')})"):
-                st.write(f"**Area**: {stay.get('area', '—')}")
-                st.write(f"**Price per night**: {stay.get('approx_price_per_night', '—')}")
-                st.write(f"**Suits**: {stay.get('suits', '—')}")
-                st.write(f"**Vibe**: {stay.get('vibe', '—')}")
-                st.write(f"**Why**: {stay.get('why', '—')}")
+                _write_fields(
+                    f"**Area**: {stay.get('area', '—')}",
+                    f"**Price per night**: {stay.get('approx_price_per_night', '—')}",
+                    f"**Suits**: {stay.get('suits', '—')}",
+                    f"**Vibe**: {stay.get('vibe', '—')}",
+                    f"**Why**: {stay.get('why', '—')}",
+                )
     else:
         st.warning("No accommodation data available.")
 
@@ -588,9 +739,8 @@ def step8_accommodation():
         st.rerun()
     if col2.button("Continue ➡️"):
         # Preload reviews
-        planner = Tripcrew(st.session_state.preferences)
-        raw = _safe_run_reviews(planner, st.session_state.selected_place)
-        st.session_state.reviews = format_data().format_reviews(raw)
+        raw = _feature_for("reviews")
+        st.session_state.reviews = FORMATTER.format_reviews(raw)
         st.session_state.step = 9
         st.rerun()
 
@@ -603,16 +753,20 @@ def step9_reviews():
         st.subheader("Attractions")
         for attraction in reviews_data.get("attractions", []):
             with st.expander(f"⭐ {attraction.get('name', '—')} (Rating: {attraction.get('average_rating', '—')})"):
-                st.write("**Pros**: " + ", ".join(attraction.get("pros", [])))
-                st.write("**Cons**: " + ", ".join(attraction.get("cons", [])))
-                st.write(f"**Tip**: {attraction.get('tip', '—')}")
+                _write_fields(
+                    "**Pros**: " + ", ".join(attraction.get("pros", [])),
+                    "**Cons**: " + ", ".join(attraction.get("cons", [])),
+                    f"**Tip**: {attraction.get('tip', '—')}",
+                )
 
         st.subheader("Restaurants")
         for restaurant in reviews_data.get("restaurants", []):
             with st.expander(f"⭐ {restaurant.get('name', '—')} (Rating: {restaurant.get('average_rating', '—')})"):
-                st.write("**Pros**: " + ", ".join(restaurant.get("pros", [])))
-                st.write("**Cons**: " + ", ".join(restaurant.get("cons", [])))
-                st.write(f"**Tip**: {restaurant.get('tip', '—')}")
+                _write_fields(
+                    "**Pros**: " + ", ".join(restaurant.get("pros", [])),
+                    "**Cons**: " + ", ".join(restaurant.get("cons", [])),
+                    f"**Tip**: {restaurant.get('tip', '—')}",
+                )
     else:
         st.warning("No reviews data available.")
 
@@ -647,15 +801,16 @@ def step10_final():
             "reviews": st.session_state.reviews,
         }
     }
-    st.session_state.final_export = final_payload
 
-    st.json(final_payload)
+    # The full payload is only sent to the browser when asked for
+    if st.toggle("Preview full JSON"):
+        st.json(final_payload)
 
     # Export
     fname = "trip_plan.json"
     st.download_button(
         label="⬇️ Download Trip Plan JSON",
-        data=json.dumps(final_payload, indent=2),
+        data=orjson.dumps(final_payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS),
         file_name=fname,
         mime="application/json",
     )
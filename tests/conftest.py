@@ -0,0 +1,81 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import agents  # noqa: E402
+
+# Long enough that crews started together are still inside the LLM call when the next one starts
+STUB_LLM_SECONDS = 0.3
+STUB_LLM_ANSWER = '{"top_attractions": [{"name": "Fort"}], "local_cuisine": []}'
+
+PREFS = {
+    "travel_type": "Leisure",
+    "total_budget": 60000,
+    "no_of_people": 2,
+    "group_type": "couple",
+    "duration": 3,
+    "interests": "forts, food",
+}
+
+
+class StubLLM:
+    """Returns `answer` for every call; counts calls and the most seen in flight at once."""
+
+    def __init__(self):
+        self.answer = STUB_LLM_ANSWER
+        self.calls = 0
+        self.peak = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, llm, messages, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            self.peak = max(self.peak, self._in_flight)
+        try:
+            time.sleep(STUB_LLM_SECONDS)
+            if llm.stream:
+                # Streaming crews read the text from chunk events, as with the real Gemini stream
+                for start in range(0, len(self.answer), 16):
+                    llm._emit_stream_chunk_event(
+                        self.answer[start:start + 16],
+                        from_task=kwargs.get("from_task"),
+                        from_agent=kwargs.get("from_agent"),
+                    )
+            return self.answer
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """Replaces the Gemini call with a slow canned answer and starts from empty caches."""
+    stub = StubLLM()
+    monkeypatch.setattr(type(agents.get_trip_agents().llm), "call", lambda llm, *a, **k: stub(llm, *a, **k))
+    for cache in (agents._CREW_CACHE, agents._RESPONSE_CACHE, agents._TRIPCREW_CACHE):
+        cache.clear()
+    return stub
+
+
+@pytest.fixture(scope="session")
+def api():
+    from fastapi.testclient import TestClient
+
+    spec = importlib.util.spec_from_file_location("main_two", ROOT / "main-two.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with TestClient(module.app) as client:
+        yield client
@@ -0,0 +1,71 @@
+from datetime import date
+
+import orjson
+
+import agents
+from conftest import PREFS
+
+CITY_ANSWER = '[{"place": "Goa", "reason": "beaches"}]'
+
+
+def test_schedule_trip_keeps_raw_as_text(stub_llm, api):
+    stub_llm.answer = '{"itinerary": [{"day": 1, "steps": [{"type": "spot", "name": "Fort"}]}]}'
+    response = api.post("/schedule-trip", json={
+        "preferences": PREFS,
+        "selected_place": "Goa",
+        "selected_attractions": ["Fort"],
+        "selected_cuisines": [],
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert isinstance(body["raw"], str)
+    assert orjson.loads(body["raw"]) == body["itinerary"]
+    assert body["itinerary"]["itinerary"][0]["steps"][0]["name"] == "Fort"
+
+
+def test_generate_rebuilds_responses_that_show_weather(stub_llm, api):
+    stub_llm.answer = CITY_ANSWER
+    prefs = {**PREFS, "start_date": date.today().isoformat(), "planning_style": "holiday_based"}
+    first = api.post("/generate", json=prefs)
+    second = api.post("/generate", json=prefs)
+
+    assert first.status_code == second.status_code == 200
+    assert "weather" in second.json()["places"][0]
+    assert stub_llm.calls == 1  # the crew output is still cached
+    assert not agents._RESPONSE_CACHE
+
+
+def test_empty_output_is_not_cached(stub_llm, api):
+    stub_llm.answer = "[]"
+    for _ in range(2):
+        assert api.post("/generate", json=PREFS).json()["places"] == []
+
+    assert stub_llm.calls == 2
+    assert not agents._CREW_CACHE and not agents._RESPONSE_CACHE
+
+
+def test_schedule_trip_shares_one_response_across_pick_orders(stub_llm, api):
+    stub_llm.answer = '{"itinerary": [{"day": 1, "steps": [{"type": "spot", "name": "Fort"}]}]}'
+    request = {"preferences": PREFS, "selected_place": "Goa", "selected_cuisines": ["Thali", "Fish curry"]}
+    first = api.post("/schedule-trip", json={**request, "selected_attractions": ["Fort", "Beach"]})
+    second = api.post("/schedule-trip", json={
+        **request, "selected_attractions": ["Beach", "Fort "], "selected_cuisines": ["Fish curry", "Thali"],
+    })
+
+    assert first.content == second.content
+    assert stub_llm.calls == 1
+    assert len(agents._RESPONSE_CACHE) == 1
+
+
+def test_cache_stats_count_response_hits_apart(stub_llm, api):
+    stub_llm.answer = CITY_ANSWER
+    before = api.get("/cache/stats").json()
+    for _ in range(3):
+        api.post("/generate", json=PREFS)
+    after = api.get("/cache/stats").json()
+
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] == before["hits"]
+    assert after["response_hits"] - before["response_hits"] == 2
+    assert after["response_entries"] == 1
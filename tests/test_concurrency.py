@@ -0,0 +1,106 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import agents
+from agents import Tripcrew, get_tripcrew
+from conftest import PREFS
+
+
+def test_local_info_batch_runs_places_concurrently(stub_llm, api):
+    places = ["Goa", "Manali", "Ooty"]
+    response = api.post("/local-info-batch", json={"preferences": PREFS, "selected_places": places})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["place"] for item in body] == places
+    assert all(item["formatted"]["top_attractions"] == [{"name": "Fort"}] for item in body)
+    assert stub_llm.peak >= 2
+
+
+def test_feature_endpoint_serves_overlapping_requests(stub_llm, api):
+    places = ["Goa", "Manali"]
+    with ThreadPoolExecutor(max_workers=len(places)) as pool:
+        responses = list(pool.map(
+            lambda place: api.post("/safety-info", json={"preferences": PREFS, "selected_place": place}),
+            places,
+        ))
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert all("formatted" in response.json() for response in responses)
+    assert stub_llm.peak >= 2
+
+
+def test_run_batch_async_overlaps_preference_sets(stub_llm):
+    stub_llm.answer = '[{"place": "Goa", "reason": "beaches"}]'
+    family = {**PREFS, "group_type": "family", "no_of_people": 4}
+    results = asyncio.run(Tripcrew.run_batch_async([PREFS, family, PREFS]))
+
+    assert [result[0]["place"] for result in results] == ["Goa"] * 3
+    assert results[0] == results[2]
+    assert stub_llm.calls == 2
+    assert stub_llm.peak == 2
+
+
+def test_shared_tripcrew_runs_flows_from_several_threads(stub_llm):
+    planner = get_tripcrew(PREFS)
+    assert get_tripcrew(dict(PREFS)) is planner
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        features = pool.submit(lambda: asyncio.run(planner.run_all_features("Goa")))
+        local_info = pool.submit(planner.run_local_expert, "Manali")
+
+        assert list(features.result()) == list(planner._feature_runs())
+        assert "Fort" in str(local_info.result())
+    assert stub_llm.peak >= 2
+
+
+def test_cancelled_stream_waiting_for_a_slot_leaks_nothing(stub_llm):
+    planner = get_tripcrew(PREFS)
+    slots = agents.CREW_MAX_CONCURRENCY
+
+    async def cancel_while_waiting():
+        task = asyncio.ensure_future(planner.run_feature_stream("safety", "Goa").__anext__())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        for _ in range(slots):
+            agents._CREW_SLOTS.release()
+        await asyncio.sleep(0.2)  # time for an abandoned waiter to grab a slot
+
+    for _ in range(slots):
+        agents._CREW_SLOTS.acquire()
+    asyncio.run(cancel_while_waiting())
+
+    taken = [agents._CREW_SLOTS.acquire(blocking=False) for _ in range(slots)]
+    for _ in range(sum(taken)):
+        agents._CREW_SLOTS.release()
+    assert all(taken)
+    assert stub_llm.calls == 0
+
+
+def test_stream_waits_for_a_crew_slot(stub_llm):
+    planner = get_tripcrew(PREFS)
+    slots = agents.CREW_MAX_CONCURRENCY
+
+    async def stream_once_slots_free():
+        chunks = []
+
+        async def consume():
+            async for chunk in planner.run_feature_stream("safety", "Goa"):
+                chunks.append(chunk)
+
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.3)
+        waited = stub_llm.calls == 0 and not chunks
+        for _ in range(slots):
+            agents._CREW_SLOTS.release()
+        await consumer
+        return waited, "".join(chunks)
+
+    for _ in range(slots):
+        agents._CREW_SLOTS.acquire()
+    waited, text = asyncio.run(stream_once_slots_free())
+
+    assert waited
+    assert text == stub_llm.answer
+    assert agents._CREW_SLOTS._value == slots
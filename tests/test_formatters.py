@@ -0,0 +1,13 @@
+from agents import FORMATTER
+
+
+def test_feature_parsers_keep_undeclared_keys():
+    raw = '```json\n{"overall_risk_level": "Low", "common_scams": ["taxi"], "curfew": "none"}\n```'
+    assert FORMATTER.format_safety_info(raw) == {
+        "overall_risk_level": "Low", "common_scams": ["taxi"], "curfew": "none",
+    }
+
+
+def test_feature_parsers_pass_through_payloads_that_miss_the_schema():
+    assert FORMATTER.format_packing_list('{"essentials": "umbrella"}') == {"essentials": "umbrella"}
+    assert FORMATTER.format_packing_list("not json") == {}